@@ -1,8 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from typing import Optional
 
-from ..database import get_db
+from ..database import AsyncSessionLocal, get_db, get_async_db
 from ..schemas.schemas import UserCreate, UserSchema
 from ..services.auth_service import AuthService
 
@@ -12,30 +15,57 @@ router = APIRouter(
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+oauth2_scheme_optional = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
 
 # might later to move this to a dedicated dependencies file deps.py
 async def get_current_user_dependency(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> UserSchema:
-    return AuthService.get_current_user(db, token)
+    return await AuthService.get_current_user_async(db, token)
+
+# EventSource can't send an Authorization header, so event streams also take ?access_token=
+async def get_stream_user_dependency(
+    token: Optional[str] = Depends(oauth2_scheme_optional),
+    access_token: Optional[str] = None
+) -> UserSchema:
+    token = token or access_token
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    # not get_async_db: a dependency's session is only closed once the stream ends
+    async with AsyncSessionLocal() as db:
+        return await AuthService.get_current_user_async(db, token)
 
 @router.post("/register", response_model=UserSchema)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     return AuthService.create_user(db, user.username, user.password)
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = AuthService.authenticate_user(db, form_data.username, form_data.password)
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+    # bcrypt is slow on purpose, keep it off the event loop
+    user = await run_in_threadpool(AuthService.authenticate_user, db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token = AuthService.create_access_token(data={"sub": user.username})
+    token_version = await AuthService.get_token_version(user.id)
+    access_token = AuthService.create_access_token(data=AuthService.user_claims(user, token_version or 0))
     return {"access_token": access_token, "token_type": "bearer"}
 
+@router.post("/logout-all")
+async def logout_all(current_user: UserSchema = Depends(get_current_user_dependency)):
+    try:
+        await AuthService.revoke_tokens(current_user.id)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Could not revoke tokens: {str(e)}")
+    return {"message": "All sessions logged out"}
+
 @router.get("/me", response_model=UserSchema)
 def read_users_me(current_user: UserSchema = Depends(get_current_user_dependency)):
     return current_user
\ No newline at end of file
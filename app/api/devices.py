@@ -1,11 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from ..database import get_db
 from ..schemas.schemas import DeviceCreate, DeviceSchema
 from ..models.models import DeviceStatus
 from ..services.device_service import DeviceService
+from ..services.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 
 router = APIRouter(
     prefix="/devices",
@@ -20,11 +21,23 @@ def create_device(device: DeviceCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/", response_model=List[DeviceSchema])
-def get_devices(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_devices(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[DeviceStatus] = None,
+    gateway_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
     try:
-        return DeviceService.get_devices_service(db, skip, limit)
+        devices, next_cursor = DeviceService.get_devices_service(db, cursor, limit, status, gateway_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return devices
 
 @router.get("/{device_id}", response_model=DeviceSchema)
 def get_device(device_id: int, db: Session = Depends(get_db)):
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File as FastAPIFile
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
-from ..database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_async_db
 from ..schemas.schemas import FileSchema, UserSchema
 from ..services.file_service import FileService
 from .auth import get_current_user_dependency
@@ -11,24 +11,40 @@ router = APIRouter(
     tags=["files"]
 )
 
-@router.post("/upload", response_model=FileSchema)
+# the body is parsed by FileService as it streams in, not by FastAPI, so describe it here
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"],
+            }
+        }
+    },
+}
+
+@router.post("/upload", response_model=FileSchema, openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
 async def upload_file(
-    file: UploadFile = FastAPIFile(...),
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        return FileService.save_file(db, file, current_user.id)
+        return await FileService.save_file(db, request, current_user.id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/", response_model=list[FileSchema])
 async def list_files(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        return FileService.get_user_files(db, current_user.id)
+        return await FileService.get_user_files(db, current_user.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -36,11 +52,11 @@ async def list_files(
 @router.get("/{file_id}/download")
 async def download_file(
     file_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        file = FileService.get_file(db, file_id, current_user.id)
+        file = await FileService.get_file(db, file_id, current_user.id)
         return FileResponse(file.path, filename=file.filename)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -48,11 +64,11 @@ async def download_file(
 @router.delete("/{file_id}")
 async def delete_file(
     file_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        FileService.delete_file(db, file_id, current_user.id)
+        await FileService.delete_file(db, file_id, current_user.id)
         return {"message": "File deleted"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
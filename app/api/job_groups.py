@@ -1,17 +1,50 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional
+import asyncio
+import json
 
-from ..database import get_db
-from ..schemas.schemas import JobGroupCreate, JobGroupSchema, UserSchema
+from ..database import SessionLocal, get_async_db, get_db
+from ..models.models import JobStatus
+from ..schemas.schemas import JobGroupBulkCreate, JobGroupCreate, JobGroupSchema, UserSchema
 from ..services.job_group_service import JobGroupService
-from .auth import get_current_user_dependency
+from ..services.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from ..queue.job_events import job_events
+from .auth import get_current_user_dependency, get_stream_user_dependency
 
 router = APIRouter(
     prefix="/job-groups",
     tags=["job groups"]
 )
 
+SSE_KEEPALIVE = 15
+
+async def _event_stream(request: Request, user_id: int, group_id: Optional[int]):
+    subscription = job_events.subscribe(user_id, group_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        job_events.unsubscribe(subscription)
+
+def _event_response(request: Request, user_id: int, group_id: Optional[int] = None):
+    return StreamingResponse(
+        _event_stream(request, user_id, group_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/", response_model=JobGroupSchema)
 def create_job_group(
     job_group: JobGroupCreate,
@@ -24,27 +57,59 @@ def create_job_group(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/queue")
-def get_queue_status(
+@router.post("/bulk", response_model=List[JobGroupSchema])
+def create_job_groups(
+    bulk: JobGroupBulkCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        return JobGroupService.get_queue_status_service(current_user.id, db)
+        return JobGroupService.create_job_groups_service(bulk.groups, current_user.id, db, background_tasks)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/queue")
+async def get_queue_status(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user_dependency)
+):
+    try:
+        return await JobGroupService.get_queue_status_service(current_user.id, db)
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.get("/events")
+def stream_user_events(
+    request: Request,
+    current_user: UserSchema = Depends(get_stream_user_dependency)
+):
+    return _event_response(request, current_user.id)
+
 @router.get("/", response_model=List[JobGroupSchema])
 def get_job_groups(
-    skip: int = 0, 
-    limit: int = 100, 
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[JobStatus] = None,
+    device_id: Optional[int] = None,
+    gateway_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
     db: Session = Depends(get_db),
     current_user: UserSchema = Depends(get_current_user_dependency)
 ):
     try:
-        return JobGroupService.get_job_groups_service(current_user.id, db, skip, limit)
+        job_groups, next_cursor = JobGroupService.get_job_groups_service(
+            current_user.id, db, cursor, limit, status, device_id, gateway_id, created_after, created_before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return job_groups
 
 @router.get("/{group_id}", response_model=JobGroupSchema)
 def get_job_group(
@@ -77,4 +142,18 @@ def get_job_group_status(
     try:
         return JobGroupService.get_job_group_status_service(group_id, current_user.id, db)
     except Exception as e:
-        raise HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/{group_id}/events")
+def stream_job_group_events(
+    group_id: int,
+    request: Request,
+    current_user: UserSchema = Depends(get_stream_user_dependency)
+):
+    # a dependency's session would stay checked out until the stream ends
+    with SessionLocal() as db:
+        try:
+            JobGroupService.get_job_group_service(group_id, current_user.id, db)
+        except Exception as e:
+            raise HTTPException(status_code=404, detail=str(e))
+    return _event_response(request, current_user.id, group_id)
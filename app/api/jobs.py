@@ -1,16 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Response
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 import os
 
 from ..config import settings
-from ..database import get_db
-from ..schemas.schemas import JobSchema, JobStatusUpdate, UserSchema
+from ..database import get_db, get_async_db
+from ..schemas.schemas import JobSchema, JobStatusBatch, JobStatusUpdate, UserSchema
 from ..api.auth import get_current_user_dependency
 from ..services.job_service import JobService
 from ..services.gateway_service import GatewayService
-from ..models.models import Job, Device
+from ..services.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from ..models.models import Job, Device, JobStatus
 
 router = APIRouter(
     prefix="/jobs",
@@ -18,11 +23,44 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[JobSchema])
-def get_jobs(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def get_jobs(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    status: Optional[JobStatus] = None,
+    group_id: Optional[int] = None,
+    device_id: Optional[int] = None,
+    gateway_id: Optional[int] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+):
     try:
-        return JobService.get_jobs_service(db, skip, limit)
+        jobs, next_cursor = JobService.get_jobs_service(
+            db, cursor, limit, status, group_id, device_id, gateway_id, created_after, created_before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return jobs
+
+@router.put("/status")
+def update_job_statuses(
+    batch: JobStatusBatch,
+    x_gateway_token: str = Header(...),
+    db: Session = Depends(get_db),
+):
+    gateway = GatewayService.get_gateway_by_token(x_gateway_token, db)
+    if not gateway:
+        raise HTTPException(status_code=403, detail="Invalid gateway token")
+    try:
+        results = JobService.update_job_statuses_service(batch.updates, db, gateway.id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"results": results}
 
 @router.get("/{job_id}", response_model=JobSchema)
 def get_job(job_id: int, db: Session = Depends(get_db)):
@@ -38,24 +76,28 @@ def update_job_status(job_id: int, status_update: JobStatusUpdate, db: Session =
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
     
+def _write_log(log_path: str, contents: bytes):
+    with open(log_path, "wb") as f:
+        f.write(contents)
+
 @router.post("/{job_id}/logs")
 async def upload_job_logs(
     job_id: int,
     log_file: UploadFile = File(...),
     x_gateway_token: str = Header(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     # Verify gateway
-    gateway = GatewayService.get_gateway_by_token(x_gateway_token, db)
+    gateway = await GatewayService.get_gateway_by_token_async(x_gateway_token, db)
     if not gateway:
         raise HTTPException(status_code=403, detail="Invalid gateway token")
     
     # Verify job exists and belongs to this gateway
-    job = db.query(Job).filter(Job.id == job_id).first()
+    job = await db.scalar(select(Job).where(Job.id == job_id))
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    device = db.query(Device).filter(Device.id == job.device_id).first()
+    device = await db.scalar(select(Device).where(Device.id == job.device_id))
     if not device or device.gateway_id != gateway.id:
         raise HTTPException(status_code=403, detail="Job not associated with this gateway")
 
@@ -65,8 +107,7 @@ async def upload_job_logs(
     
     try:
         contents = await log_file.read()
-        with open(log_path, "wb") as f:
-            f.write(contents)
+        await run_in_threadpool(_write_log, log_path, contents)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving logs: {str(e)}")
     
@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends
+
+from ..schemas.schemas import UserSchema
+from ..scheduler.scheduler import scheduler
+from ..scheduler.archiver import archiver
+from ..scheduler.liveness import liveness_monitor, liveness_store
+from ..services.gateway_token_cache import gateway_token_cache
+from .auth import get_current_user_dependency
+
+router = APIRouter(
+    prefix="/stats",
+    tags=["stats"]
+)
+
+@router.get("/scheduler")
+def get_scheduler_stats(current_user: UserSchema = Depends(get_current_user_dependency)):
+    return scheduler.get_stats()
+
+@router.get("/archiver")
+def get_archiver_stats(current_user: UserSchema = Depends(get_current_user_dependency)):
+    return archiver.get_stats()
+
+@router.get("/liveness")
+def get_liveness_stats(current_user: UserSchema = Depends(get_current_user_dependency)):
+    return {**liveness_store.get_stats(), **liveness_monitor.get_stats()}
+
+@router.get("/gateway-token-cache")
+def get_gateway_token_cache_stats(current_user: UserSchema = Depends(get_current_user_dependency)):
+    return gateway_token_cache.get_stats()
@@ -1,16 +1,61 @@
 from pydantic_settings import BaseSettings
+from typing import Optional
 
 class Settings(BaseSettings):
 
     # will change this stuff later and move them to .env file
     DATABASE_URL: str = "sqlite:///./iot_testbed.db"
+    # derived from DATABASE_URL (aiosqlite / asyncpg) unless set
+    ASYNC_DATABASE_URL: Optional[str] = None
+    # sqlite profile, applied to every connection
+    SQLITE_JOURNAL_MODE: str = "wal"  # "delete" restores sqlite's default rollback journal
+    SQLITE_SYNCHRONOUS: str = "normal"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # postgresql profile
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800  # seconds
+    DB_PREPARE_THRESHOLD: int = 5  # psycopg: executions before a statement is prepared server side
+    DB_STATEMENT_CACHE_SIZE: int = 500  # asyncpg: prepared statements kept per connection
     REDIS_URL: str = "redis://redis:6379/0"
     API_PREFIX: str = "/api/v1"
     JWT_SECRET_KEY: str = "secret" # replace with a strong secret key
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # how long an instance trusts its copy of a user's token version (logout-all), seconds
+    TOKEN_VERSION_CACHE_TTL: float = 5
     UPLOAD_DIR: str = "./uploads"
     LOGS_DIR: str = "./logs"
+    MAX_UPLOAD_SIZE: int = 256 * 1024 * 1024  # bytes, larger uploads get 413
+    # the scheduler is woken by events; the sweep is only a safety net
+    SCHEDULER_SWEEP_INTERVAL: float = 30
+    SCHEDULER_POLICY: str = "fifo"  # fifo, easy or conservative (backfill)
+    SCHEDULER_DEFAULT_RUNTIME: float = 120  # seconds, used until there is job history
+    # gateways are split into shards, each owned by one scheduler instance via a redis lease
+    SCHEDULER_SHARDS: int = 16
+    SCHEDULER_LEASE_TTL: float = 15  # seconds
+    # the owner of shard 0 plans the whole queue for /job-groups/queue this often
+    SCHEDULER_ESTIMATE_INTERVAL: float = 10  # seconds
+    # a dispatch whose jobs haven't reached redis this long after its commit is undone
+    SCHEDULER_DISPATCH_TIMEOUT: float = 60  # seconds
+    # "list" (LPUSH/BRPOP) or "stream" (XADD/XREADGROUP with acks), must match the gateways
+    QUEUE_TRANSPORT: str = "list"
+    # "json" or "msgpack"; gateways decode both, so only switch once they are all updated
+    QUEUE_CODEC: str = "json"
+    # finished job groups older than this move to the archive tables, 0 keeps everything hot
+    ARCHIVE_AFTER_DAYS: float = 30
+    ARCHIVE_INTERVAL: float = 3600  # seconds
+    ARCHIVE_BATCH_SIZE: int = 500  # groups moved per transaction
+    # heartbeats that change nothing only update the liveness store, which writes last_seen in batches
+    HEARTBEAT_FLUSH_INTERVAL: float = 15  # seconds
+    HEARTBEAT_RESYNC_INTERVAL: float = 300  # seconds between database checks of an unchanged gateway
+    # a gateway silent this long is set offline with its devices, keep it well above the flush interval
+    GATEWAY_TIMEOUT: float = 90  # seconds
+    # token hash -> gateway, checked before the database on every gateway request
+    GATEWAY_TOKEN_CACHE_SIZE: int = 1024
+    GATEWAY_TOKEN_CACHE_TTL: float = 60  # seconds
     
     class Config:
         env_file = ".env"
@@ -1,16 +1,89 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# async drivers for the sync database urls we support
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def sync_database_url(url: str) -> str:
+    # plain postgresql:// would pick psycopg2, which can't prepare statements server side
+    parsed = make_url(url)
+    if parsed.drivername == "postgresql":
+        parsed = parsed.set(drivername="postgresql+psycopg")
+    return parsed.render_as_string(hide_password=False)
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer and, with synchronous=NORMAL,
+    # only fsyncs at checkpoints; the busy timeout makes writers queue instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.close()
+
+def _pool_options() -> dict:
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+def create_db_engine(url: str) -> Engine:
+    url = sync_database_url(url)
+    if make_url(url).get_backend_name() == "sqlite":
+        db_engine = create_engine(url, connect_args={"check_same_thread": False})
+        event.listen(db_engine, "connect", _apply_sqlite_pragmas)
+        return db_engine
+    return create_engine(
+        url,
+        connect_args={"prepare_threshold": settings.DB_PREPARE_THRESHOLD},
+        **_pool_options()
+    )
+
+def create_async_db_engine(url: str) -> AsyncEngine:
+    if make_url(url).get_backend_name() == "sqlite":
+        db_engine = create_async_engine(url)
+        event.listen(db_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+        return db_engine
+    # asyncpg prepares every statement, keep the prepared ones per connection
+    return create_async_engine(
+        url,
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+        **_pool_options()
+    )
+
+engine = create_db_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# used by async routes and the scheduler so they never block the event loop on the database
+async_engine = create_async_db_engine(settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL))
+# objects stay usable after commit, an expired attribute can't be lazy loaded outside a greenlet
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # dependency for obtaining a database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# dependency for obtaining an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
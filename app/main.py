@@ -4,23 +4,34 @@ from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import os
 
-from .api import devices, gateways, job_groups, jobs, auth, files
-from .models.models import Base
-from .database import engine
+from .api import devices, gateways, job_groups, jobs, auth, files, stats
+from .migrations import upgrade_database
 from .queue.redis_client import redis_client
+from .queue.job_events import job_events
 from .scheduler.scheduler import scheduler
+from .scheduler.archiver import archiver
+from .scheduler.liveness import liveness_monitor, liveness_store
+from .services.pagination import NEXT_CURSOR_HEADER
 from .config import settings
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    Base.metadata.create_all(bind=engine)
+    upgrade_database()
     await redis_client.init()
     await redis_client.ping()
+    job_events.start(asyncio.get_running_loop())
     asyncio.create_task(scheduler.start())
+    asyncio.create_task(archiver.start())
+    asyncio.create_task(liveness_store.start())
+    asyncio.create_task(liveness_monitor.start())
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     os.makedirs(settings.LOGS_DIR, exist_ok=True) 
     yield
+    await liveness_monitor.stop()
+    await liveness_store.stop()
+    await archiver.stop()
     await scheduler.stop()
+    await job_events.stop()
     await redis_client.close()
 
 
@@ -34,7 +45,9 @@ app.add_middleware(
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
-    allow_headers=["*"]
+    allow_headers=["*"],
+    # lets browser clients read the list endpoints' next page cursor
+    expose_headers=[NEXT_CURSOR_HEADER]
 )
 
 api_routers = [
@@ -43,7 +56,8 @@ api_routers = [
     job_groups.router,
     jobs.router,
     auth.router,
-    files.router
+    files.router,
+    stats.router
 ]
 
 for router in api_routers:
@@ -0,0 +1,61 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+
+from ..database import engine
+
+logger = logging.getLogger(__name__)
+
+BASELINE_REVISION = "0001"
+# arbitrary, the same in every instance
+MIGRATION_LOCK_ID = 7041501
+MIGRATION_LOCK_POLL = 1  # seconds
+
+@contextmanager
+def migration_lock(db_engine=engine):
+    """Lets one instance at a time run the upgrade when several start together.
+
+    A postgres session advisory lock, held on a connection of its own. It is
+    polled rather than waited for: a session blocked in pg_advisory_lock
+    holds a snapshot, and CREATE INDEX CONCURRENTLY in the running upgrade
+    would wait for it. SQLite setups run a single instance and take no lock.
+    """
+    if db_engine.dialect.name != "postgresql":
+        yield
+        return
+    with db_engine.connect() as connection:
+        connection.execution_options(isolation_level="AUTOCOMMIT")
+        params = {"lock_id": MIGRATION_LOCK_ID}
+        if not connection.scalar(text("SELECT pg_try_advisory_lock(:lock_id)"), params):
+            logger.info("Waiting for another instance to finish migrating the database")
+            while not connection.scalar(text("SELECT pg_try_advisory_lock(:lock_id)"), params):
+                time.sleep(MIGRATION_LOCK_POLL)
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), params)
+
+def upgrade_database(db_engine=engine):
+    """Bring the schema up to the latest migration.
+
+    Databases created by create_all before migrations existed have the
+    baseline tables but no alembic_version table; they are stamped at the
+    baseline first so only the later revisions run. Instances starting
+    together take turns, the later ones find the schema already current.
+    """
+    config = Config()
+    config.set_main_option("script_location", os.path.dirname(__file__))
+    # no outer transaction: alembic commits per migration, and some
+    # migrations need to step outside of a transaction on postgres
+    with migration_lock(db_engine), db_engine.connect() as connection:
+        config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        connection.commit()
+        if "alembic_version" not in tables and "jobs" in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, "head")
@@ -0,0 +1,34 @@
+from alembic import context
+
+from app.config import settings
+from app.database import create_db_engine
+from app.models.models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+def run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # sqlite can only alter tables by copying them
+        render_as_batch=connection.dialect.name == "sqlite",
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # upgrade_database() hands over its connection, the alembic cli doesn't
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        run_migrations(connection)
+        return
+    db_engine = create_db_engine(settings.DATABASE_URL)
+    with db_engine.connect() as connection:
+        run_migrations(connection)
+    db_engine.dispose()
+
+if context.is_offline_mode():
+    raise SystemExit("offline (--sql) migrations are not supported")
+run_migrations_online()
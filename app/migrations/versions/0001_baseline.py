@@ -0,0 +1,97 @@
+"""baseline schema, as created by create_all before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+device_status = sa.Enum("available", "busy", "offline", name="devicestatus")
+job_status = sa.Enum("preparing", "pending", "running", "completed", "failed", "cancelled", name="jobstatus")
+verification_status = sa.Enum("unverified", "verified", name="verificationstatus")
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("password_hash", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "gateways",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+        sa.Column("ip_address", sa.String(), nullable=True),
+        sa.Column("token_hash", sa.String(), nullable=False),
+        sa.Column("verification_status", verification_status, nullable=False),
+        sa.Column("status", device_status, nullable=False),
+        sa.Column("last_seen", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "devices",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False, unique=True),
+        sa.Column("gateway_id", sa.Integer(), sa.ForeignKey("gateways.id"), nullable=False),
+        sa.Column("status", device_status, nullable=False),
+        sa.Column("last_seen", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "files",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("filename", sa.String(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+    op.create_table(
+        "job_groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("job_groups.id"), nullable=False),
+        sa.Column("device_id", sa.Integer(), sa.ForeignKey("devices.id"), nullable=False),
+        sa.Column("source_file_id", sa.Integer(), sa.ForeignKey("files.id"), nullable=False),
+        sa.Column("output_file_id", sa.Integer(), sa.ForeignKey("files.id"), nullable=True),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade():
+    op.drop_table("jobs")
+    op.drop_table("job_groups")
+    op.drop_table("files")
+    op.drop_table("devices")
+    op.drop_table("gateways")
+    op.drop_index("ix_users_username", table_name="users")
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_table("users")
+    bind = op.get_bind()
+    for enum in (device_status, job_status, verification_status):
+        enum.drop(bind, checkfirst=True)
@@ -0,0 +1,41 @@
+"""indexes for the hot query paths
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_gateways_token_hash", "gateways", ["token_hash"]),
+    ("ix_devices_gateway_id", "devices", ["gateway_id"]),
+    ("ix_files_user_id", "files", ["user_id"]),
+    ("ix_job_groups_status_created_at", "job_groups", ["status", "created_at", "id"]),
+    ("ix_job_groups_user_id_status_created_at", "job_groups", ["user_id", "status", "created_at"]),
+    ("ix_job_groups_user_id_created_at", "job_groups", ["user_id", "created_at"]),
+    ("ix_jobs_group_id_status", "jobs", ["group_id", "status"]),
+    ("ix_jobs_device_id_status", "jobs", ["device_id", "status"]),
+    ("ix_jobs_status_completed_at", "jobs", ["status", "completed_at"]),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        # build without blocking writes to large tables, which can't happen inside a transaction
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        return
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,40 @@
+"""per-status job counters on job_groups
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+STATUSES = ["preparing", "pending", "running", "completed", "failed", "cancelled"]
+COUNTERS = ["jobs_total"] + [f"jobs_{status}" for status in STATUSES]
+
+
+def upgrade():
+    with op.batch_alter_table("job_groups") as batch:
+        for counter in COUNTERS:
+            batch.add_column(sa.Column(counter, sa.Integer(), server_default="0", nullable=False))
+
+    # backfill from the jobs table, one pass per counter
+    op.execute(
+        "UPDATE job_groups SET jobs_total = "
+        "(SELECT count(*) FROM jobs WHERE jobs.group_id = job_groups.id)"
+    )
+    for status in STATUSES:
+        op.execute(
+            f"UPDATE job_groups SET jobs_{status} = "
+            f"(SELECT count(*) FROM jobs WHERE jobs.group_id = job_groups.id AND jobs.status = '{status}')"
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("job_groups") as batch:
+        for counter in reversed(COUNTERS):
+            batch.drop_column(counter)
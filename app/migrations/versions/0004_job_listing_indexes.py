@@ -0,0 +1,34 @@
+"""indexes for keyset pagination of the job listing
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_jobs_created_at_id", "jobs", ["created_at", "id"]),
+    ("ix_jobs_status_created_at_id", "jobs", ["status", "created_at", "id"]),
+    ("ix_jobs_device_id_created_at_id", "jobs", ["device_id", "created_at", "id"]),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        return
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
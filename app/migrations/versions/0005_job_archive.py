@@ -0,0 +1,62 @@
+"""archive tables for finished job groups and their jobs
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# created by the baseline revision
+job_status = sa.Enum(
+    "preparing", "pending", "running", "completed", "failed", "cancelled",
+    name="jobstatus", create_type=False,
+)
+COUNTERS = ["jobs_total", "jobs_preparing", "jobs_pending", "jobs_running",
+            "jobs_completed", "jobs_failed", "jobs_cancelled"]
+
+
+def upgrade():
+    op.create_table(
+        "job_groups_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+        *[sa.Column(counter, sa.Integer(), nullable=False) for counter in COUNTERS],
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_job_groups_archive_user_id_status_created_at", "job_groups_archive",
+                    ["user_id", "status", "created_at"])
+    op.create_index("ix_job_groups_archive_user_id_created_at", "job_groups_archive", ["user_id", "created_at"])
+
+    op.create_table(
+        "jobs_archive",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("job_groups_archive.id"), nullable=False),
+        sa.Column("device_id", sa.Integer(), nullable=False),
+        sa.Column("source_file_id", sa.Integer(), nullable=False),
+        sa.Column("output_file_id", sa.Integer(), nullable=True),
+        sa.Column("status", job_status, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("completed_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_jobs_archive_group_id", "jobs_archive", ["group_id"])
+    op.create_index("ix_jobs_archive_created_at_id", "jobs_archive", ["created_at", "id"])
+    op.create_index("ix_jobs_archive_status_created_at_id", "jobs_archive", ["status", "created_at", "id"])
+    op.create_index("ix_jobs_archive_device_id_created_at_id", "jobs_archive", ["device_id", "created_at", "id"])
+
+
+def downgrade():
+    op.drop_table("jobs_archive")
+    op.drop_table("job_groups_archive")
@@ -0,0 +1,28 @@
+"""index gateways.last_seen for the liveness monitor
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.create_index(
+                "ix_gateways_last_seen", "gateways", ["last_seen"],
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+        return
+    op.create_index("ix_gateways_last_seen", "gateways", ["last_seen"])
+
+
+def downgrade():
+    op.drop_index("ix_gateways_last_seen", table_name="gateways")
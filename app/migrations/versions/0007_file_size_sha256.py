@@ -0,0 +1,26 @@
+"""size and sha256 of uploaded files
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("files") as batch:
+        batch.add_column(sa.Column("size", sa.BigInteger(), nullable=True))
+        batch.add_column(sa.Column("sha256", sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("files") as batch:
+        batch.drop_column("sha256")
+        batch.drop_column("size")
@@ -0,0 +1,41 @@
+"""never reuse job and job group ids on sqlite
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+# hot table -> archive table keeping its ids
+TABLES = {"job_groups": "job_groups_archive", "jobs": "jobs_archive"}
+
+
+def upgrade():
+    # postgres sequences never hand out an id twice, sqlite reuses the highest
+    # rowid once the archiver deletes it unless the table is AUTOINCREMENT
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table, archive in TABLES.items():
+        with op.batch_alter_table(table, recreate="always", table_kwargs={"sqlite_autoincrement": True}):
+            pass
+        # start above every id handed out so far, including the archived ones
+        op.execute(sa.text("DELETE FROM sqlite_sequence WHERE name = :name").bindparams(name=table))
+        op.execute(sa.text(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT :name, max("
+            f"(SELECT coalesce(max(id), 0) FROM {table}), (SELECT coalesce(max(id), 0) FROM {archive}))"
+        ).bindparams(name=table))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        with op.batch_alter_table(table, recreate="always", table_kwargs={"sqlite_autoincrement": False}):
+            pass
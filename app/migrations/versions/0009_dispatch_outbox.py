@@ -0,0 +1,28 @@
+"""outbox of dispatches whose jobs may not have reached redis
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "dispatch_outbox",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("job_groups.id"), primary_key=True, autoincrement=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_dispatch_outbox_created_at", "dispatch_outbox", ["created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_dispatch_outbox_created_at", table_name="dispatch_outbox")
+    op.drop_table("dispatch_outbox")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum as SQLEnum
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Enum as SQLEnum
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
@@ -29,7 +29,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True)
     password_hash = Column(String)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
     job_groups = relationship("JobGroup", back_populates="user")
     files = relationship("File", back_populates="user")
@@ -40,10 +40,10 @@ class Gateway(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, nullable=False)
     ip_address = Column(String, nullable=True)
-    token_hash = Column(String, nullable=False)
+    token_hash = Column(String, nullable=False, index=True)  # looked up on every gateway request
     verification_status = Column(SQLEnum(VerificationStatus), default=VerificationStatus.unverified, nullable=False)
     status = Column(SQLEnum(DeviceStatus), default=DeviceStatus.offline, nullable=False)
-    last_seen = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    last_seen = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)  # stale gateway sweep
     
     devices = relationship("Device", back_populates="gateway")
 
@@ -52,27 +52,58 @@ class Device(Base):
     
     id = Column(Integer, primary_key=True)
     name = Column(String, unique=True, nullable=False)
-    gateway_id = Column(Integer, ForeignKey('gateways.id'), nullable=False)
+    gateway_id = Column(Integer, ForeignKey('gateways.id'), nullable=False, index=True)
     status = Column(SQLEnum(DeviceStatus), default=DeviceStatus.available, nullable=False)
-    last_seen = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    last_seen = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
 
     gateway = relationship("Gateway", back_populates="devices")
     jobs = relationship("Job", back_populates="device")
 
-class JobGroup(Base):
+class JobCountersMixin:
+    """Reads the per-status job counters of a job group row."""
+
+    @classmethod
+    def job_counter(cls, status: JobStatus):
+        return getattr(cls, f"jobs_{JobStatus(status).value}")
+
+    def job_stats(self) -> dict:
+        return {
+            "total": self.jobs_total,
+            **{status.value: getattr(self, f"jobs_{status.value}") for status in JobStatus},
+        }
+
+class JobGroup(JobCountersMixin, Base):
     __tablename__ = 'job_groups'
     
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     status = Column(SQLEnum(JobStatus), default=JobStatus.pending, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
+    # job counts per status, moved in the same transaction as every job transition
+    jobs_total = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_preparing = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_pending = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_running = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_completed = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_failed = Column(Integer, default=0, server_default="0", nullable=False)
+    jobs_cancelled = Column(Integer, default=0, server_default="0", nullable=False)
 
     user = relationship("User", back_populates="job_groups")
     jobs = relationship("Job", back_populates="group")
 
+    __table_args__ = (
+        # scheduler queue scan: pending groups in arrival order
+        Index("ix_job_groups_status_created_at", "status", "created_at", "id"),
+        # a user's queue and group listings
+        Index("ix_job_groups_user_id_status_created_at", "user_id", "status", "created_at"),
+        Index("ix_job_groups_user_id_created_at", "user_id", "created_at"),
+        # archived ids must never come back, sqlite reuses the highest one otherwise
+        {"sqlite_autoincrement": True},
+    )
+
 class Job(Base):
     __tablename__ = 'jobs'
     
@@ -82,7 +113,7 @@ class Job(Base):
     source_file_id = Column(Integer, ForeignKey('files.id'), nullable=False)
     output_file_id = Column(Integer, ForeignKey('files.id'), nullable=True)
     status = Column(SQLEnum(JobStatus), default=JobStatus.pending, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     
@@ -91,13 +122,96 @@ class Job(Base):
     source_file = relationship("File", foreign_keys=[source_file_id])
     output_file = relationship("File", foreign_keys=[output_file_id])
 
+    __table_args__ = (
+        # jobs of a group, optionally by status (status page, cancel, dispatch)
+        Index("ix_jobs_group_id_status", "group_id", "status"),
+        # running job per device (scheduler free-at estimates)
+        Index("ix_jobs_device_id_status", "device_id", "status"),
+        # most recently completed jobs (runtime estimator)
+        Index("ix_jobs_status_completed_at", "status", "completed_at"),
+        # job listing pages, newest first, unfiltered or by status or device
+        Index("ix_jobs_created_at_id", "created_at", "id"),
+        Index("ix_jobs_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_jobs_device_id_created_at_id", "device_id", "created_at", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+class DispatchOutbox(Base):
+    """A dispatched job group whose jobs may not have reached redis yet.
+
+    Written in the transaction that claims the group and deleted once its jobs
+    are pushed, so a scheduler dying in between leaves a row behind to repair.
+    """
+    __tablename__ = 'dispatch_outbox'
+
+    group_id = Column(Integer, ForeignKey('job_groups.id'), primary_key=True, autoincrement=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_dispatch_outbox_created_at", "created_at"),
+    )
+
+class ArchivedJobGroup(JobCountersMixin, Base):
+    """A finished job group moved out of job_groups by the archiver, keeping its id."""
+    __tablename__ = 'job_groups_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    status = Column(SQLEnum(JobStatus), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+    jobs_total = Column(Integer, nullable=False)
+    jobs_preparing = Column(Integer, nullable=False)
+    jobs_pending = Column(Integer, nullable=False)
+    jobs_running = Column(Integer, nullable=False)
+    jobs_completed = Column(Integer, nullable=False)
+    jobs_failed = Column(Integer, nullable=False)
+    jobs_cancelled = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+
+    jobs = relationship("ArchivedJob", back_populates="group")
+
+    __table_args__ = (
+        Index("ix_job_groups_archive_user_id_status_created_at", "user_id", "status", "created_at"),
+        Index("ix_job_groups_archive_user_id_created_at", "user_id", "created_at"),
+    )
+
+class ArchivedJob(Base):
+    """A job of an archived group. Device and file ids are kept without foreign
+    keys so archived history doesn't pin rows the hot tables have let go of."""
+    __tablename__ = 'jobs_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    group_id = Column(Integer, ForeignKey('job_groups_archive.id'), nullable=False)
+    device_id = Column(Integer, nullable=False)
+    source_file_id = Column(Integer, nullable=False)
+    output_file_id = Column(Integer, nullable=True)
+    status = Column(SQLEnum(JobStatus), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    completed_at = Column(DateTime, nullable=True)
+
+    group = relationship("ArchivedJobGroup", back_populates="jobs")
+
+    __table_args__ = (
+        Index("ix_jobs_archive_group_id", "group_id"),
+        Index("ix_jobs_archive_created_at_id", "created_at", "id"),
+        Index("ix_jobs_archive_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_jobs_archive_device_id_created_at_id", "device_id", "created_at", "id"),
+    )
+
 class File(Base):
     __tablename__ = 'files'
     
     id = Column(Integer, primary_key=True)
     filename = Column(String, nullable=False)
     path = Column(String, nullable=False)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    # computed while the upload streams in, null for files uploaded before
+    size = Column(BigInteger, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     
     user = relationship("User", back_populates="files")
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from .redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+class EventSubscription:
+    """A single event stream client, optionally narrowed to one job group."""
+
+    def __init__(self, user_id: int, group_id: Optional[int], maxsize: int):
+        self.user_id = user_id
+        self.group_id = group_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def offer(self, event: Dict[str, Any]):
+        if self.group_id is not None and event.get("group_id") != self.group_id:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # a client this far behind has to refetch anyway, tell it so
+            # instead of blocking the fan-out on it
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "group_id": self.group_id})
+
+class JobEventBroker:
+    """Publishes job and job group status transitions and fans them out to subscribers.
+
+    `publish` is safe to call from the sync route handlers (which run in the
+    threadpool) as well as from the event loop. Events raised in the same loop
+    iteration are sent as one redis message. Each API instance keeps a single
+    subscription to the events channel and hands every event to its local
+    subscribers for the event's user.
+    """
+
+    QUEUE_SIZE = 256
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._outbox: List[Dict[str, Any]] = []
+        self._subscribers: Dict[int, Set[EventSubscription]] = defaultdict(set)
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = False
+
+    def publish(self, event_type: str, user_id: int, group_id: int, status: str,
+                job_id: Optional[int] = None):
+        if self._loop is None or self._loop.is_closed():
+            return
+        event = {
+            "type": event_type,
+            "user_id": user_id,
+            "group_id": group_id,
+            "status": status,
+            "at": datetime.now(timezone.utc).isoformat(),
+        }
+        if job_id is not None:
+            event["job_id"] = job_id
+        self._loop.call_soon_threadsafe(self._enqueue, event)
+
+    def _enqueue(self, event: Dict[str, Any]):
+        self._outbox.append(event)
+        if len(self._outbox) == 1:
+            asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        events, self._outbox = self._outbox, []
+        try:
+            await redis_client.publish_job_events(events)
+        except Exception as e:
+            logger.warning(f"Could not publish {len(events)} job events: {e}")
+
+    def subscribe(self, user_id: int, group_id: Optional[int] = None) -> EventSubscription:
+        subscription = EventSubscription(user_id, group_id, self.QUEUE_SIZE)
+        self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def _fan_out(self, events: List[Dict[str, Any]]):
+        for event in events:
+            for subscription in list(self._subscribers.get(event.get("user_id"), ())):
+                subscription.offer(event)
+
+    async def listen(self):
+        while self._listening:
+            pubsub = redis_client.job_events_pubsub()
+            try:
+                await pubsub.subscribe(redis_client.JOB_EVENTS_CHANNEL)
+                while self._listening:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or not self._subscribers:
+                        continue
+                    self._fan_out(json.loads(message["data"]))
+            except Exception as e:
+                logger.warning(f"Job event subscription lost: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._listening = True
+        self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self):
+        self._listening = False
+        if self._listener is not None:
+            try:
+                await asyncio.wait_for(self._listener, 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._listener = None
+
+job_events = JobEventBroker()
@@ -1,11 +1,37 @@
 import redis.asyncio as redis
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
 from ..config import settings
+from .payload_codecs import decode, get_codec
+
+# compare-and-set helpers for leases: only the owner may renew or release
+_RENEW_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
 
 class RedisClient:
+    SCHEDULER_EVENTS_CHANNEL = "scheduler:events"
+    SCHEDULER_INSTANCES_KEY = "scheduler:instances"
+    QUEUE_ESTIMATES_KEY = "scheduler:queue_estimates"
+    JOB_EVENTS_CHANNEL = "job:events"
+    JOBS_QUEUE = "jobs"
+    DOWNLOADS_QUEUE = "download_notifications"
+
     def __init__(self):
         self.redis_url = settings.REDIS_URL
+        self.transport = settings.QUEUE_TRANSPORT
+        self.codec = get_codec(settings.QUEUE_CODEC)
         self._redis: redis.Redis = None
 
     async def init(self):
@@ -29,16 +55,47 @@ class RedisClient:
         if self._redis is not None:
             await self._redis.close()
     
+    def _queue_key(self, gateway_id: int, queue: str) -> str:
+        if self.transport == "stream":
+            return f"gateway:{gateway_id}:{queue}:stream"
+        return f"gateway:{gateway_id}:{queue}"
+
+    def _enqueue(self, pipe, gateway_id: int, queue: str, items: List[Dict[str, Any]]):
+        queue_key = self._queue_key(gateway_id, queue)
+        if self.transport == "stream":
+            for item in items:
+                pipe.xadd(queue_key, {"data": self.codec.encode(item)})
+        else:
+            pipe.lpush(queue_key, *(self.codec.encode(item) for item in items))
+
     async def push_job(self, gateway_id: int, job_data: Dict[str, Any]):
-        queue_key = f"gateway:{gateway_id}:jobs"
-        await self._redis.lpush(queue_key, json.dumps(job_data))
+        await self.push_jobs({gateway_id: [job_data]})
     
+    def _dispatch_marker_key(self, group_id: int) -> str:
+        return f"scheduler:dispatched:{group_id}"
+
+    async def push_jobs(self, jobs_by_gateway: Dict[int, List[Dict[str, Any]]],
+                        group_id: Optional[int] = None, marker_ttl: float = 0):
+        # one round-trip for the whole batch; MULTI makes it all-or-nothing
+        pipe = self._redis.pipeline(transaction=True)
+        for gateway_id, jobs in jobs_by_gateway.items():
+            if jobs:
+                self._enqueue(pipe, gateway_id, self.JOBS_QUEUE, jobs)
+        if group_id is not None:
+            # tells the scheduler's reconcile that this group's jobs made it
+            # redis rejects a zero ttl and MULTI would still run the pushes
+            pipe.set(self._dispatch_marker_key(group_id), 1, px=max(1000, int(marker_ttl * 1000)))
+        await pipe.execute()
+
+    async def was_dispatched(self, group_id: int) -> bool:
+        return bool(await self._redis.exists(self._dispatch_marker_key(group_id)))
+
     async def get_job(self, gateway_id: int) -> Optional[Dict[str, Any]]:
         queue_key = f"gateway:{gateway_id}:jobs"
         result = await self._redis.brpop(queue_key, timeout=30)
         if result:
             _, job_data = result
-            return json.loads(job_data)
+            return decode(job_data)
         return None
 
     async def publish_status(self, job_id: int, status: str, message: str):
@@ -48,16 +105,89 @@ class RedisClient:
             "message": message
         }))
 
+    async def publish_scheduler_event(self, origin: str, reason: str):
+        await self._redis.publish(self.SCHEDULER_EVENTS_CHANNEL, f"{origin}:{reason}")
+
+    def scheduler_events_pubsub(self):
+        return self._redis.pubsub(ignore_subscribe_messages=True)
+
+    async def publish_job_events(self, events: List[Dict[str, Any]]):
+        # one message per batch, every API instance fans it out to its own subscribers
+        await self._redis.publish(self.JOB_EVENTS_CHANNEL, json.dumps(events))
+
+    def job_events_pubsub(self):
+        return self._redis.pubsub(ignore_subscribe_messages=True)
+
+    async def acquire_lease(self, key: str, owner: str, ttl_ms: int) -> bool:
+        return bool(await self._redis.set(key, owner, nx=True, px=ttl_ms))
+
+    async def renew_lease(self, key: str, owner: str, ttl_ms: int) -> bool:
+        return bool(await self._redis.eval(_RENEW_LEASE, 1, key, owner, ttl_ms))
+
+    async def release_lease(self, key: str, owner: str) -> bool:
+        return bool(await self._redis.eval(_RELEASE_LEASE, 1, key, owner))
+
+    async def heartbeat_scheduler_instance(self, instance_id: str, ttl: float) -> int:
+        # returns the number of live scheduler instances, including this one
+        now = time.time()
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.zadd(self.SCHEDULER_INSTANCES_KEY, {instance_id: now + ttl})
+        pipe.zremrangebyscore(self.SCHEDULER_INSTANCES_KEY, "-inf", now)
+        pipe.zcard(self.SCHEDULER_INSTANCES_KEY)
+        _, _, live = await pipe.execute()
+        return live
+
+    async def unregister_scheduler_instance(self, instance_id: str):
+        await self._redis.zrem(self.SCHEDULER_INSTANCES_KEY, instance_id)
+
+    async def set_queue_estimates(self, estimates: Dict[int, Dict[str, Any]], ttl: float):
+        # replace the whole hash at once, readers never see half of two plans
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.delete(self.QUEUE_ESTIMATES_KEY)
+        if estimates:
+            pipe.hset(self.QUEUE_ESTIMATES_KEY, mapping={
+                group_id: json.dumps(estimate) for group_id, estimate in estimates.items()
+            })
+            pipe.pexpire(self.QUEUE_ESTIMATES_KEY, int(ttl * 1000))
+        await pipe.execute()
+
+    async def get_queue_estimates(self, group_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        if not group_ids:
+            return {}
+        values = await self._redis.hmget(self.QUEUE_ESTIMATES_KEY, group_ids)
+        return {
+            group_id: json.loads(value)
+            for group_id, value in zip(group_ids, values)
+            if value is not None
+        }
+
+    def _token_version_key(self, user_id: int) -> str:
+        return f"auth:token_version:{user_id}"
+
+    async def get_token_version(self, user_id: int) -> int:
+        version = await self._redis.get(self._token_version_key(user_id))
+        return int(version) if version else 0
+
+    async def bump_token_version(self, user_id: int) -> int:
+        return await self._redis.incr(self._token_version_key(user_id))
+
     async def push_download_notification(self, gateway_id: int, notification: Dict[str, Any]):
-        queue_key = f"gateway:{gateway_id}:download_notifications"
-        await self._redis.lpush(queue_key, json.dumps(notification))
+        await self.push_download_notifications({gateway_id: [notification]})
+
+    async def push_download_notifications(self, notifications_by_gateway: Dict[int, List[Dict[str, Any]]]):
+        # one round-trip, one push per gateway
+        pipe = self._redis.pipeline(transaction=False)
+        for gateway_id, notifications in notifications_by_gateway.items():
+            if notifications:
+                self._enqueue(pipe, gateway_id, self.DOWNLOADS_QUEUE, notifications)
+        await pipe.execute()
     
     async def get_download_notification(self, gateway_id: int) -> Optional[Dict[str, Any]]:
         queue_key = f"gateway:{gateway_id}:download_notifications"
         result = await self._redis.brpop(queue_key, timeout=30)
         if result:
             _, notification_data = result
-            return json.loads(notification_data)
+            return decode(notification_data)
         return None
 
 redis_client = RedisClient()
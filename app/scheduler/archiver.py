@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from sqlalchemy import DateTime, delete, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.models import ArchivedJob, ArchivedJobGroup, Job, JobGroup, JobStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = [JobStatus.completed, JobStatus.failed, JobStatus.cancelled]
+
+class JobArchiver:
+    """Moves finished job groups and their jobs from the hot tables to the archive tables.
+
+    A group is archived once it is in a terminal status and both its creation
+    and its completion are older than ARCHIVE_AFTER_DAYS. Each batch is copied
+    and deleted in one transaction, so a group is always in exactly one of the
+    two places. Instances racing on the same batch collide on the archive
+    primary keys and the loser rolls back.
+    """
+
+    def __init__(self):
+        self.running = False
+        self.archived_groups = 0
+        self.archived_jobs = 0
+        self.last_run_at: Optional[datetime] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    async def archive_batch(self, db: AsyncSession, cutoff: datetime, batch_size: int) -> Tuple[int, int]:
+        group_ids = list(await db.scalars(
+            select(JobGroup.id)
+            .where(
+                JobGroup.status.in_(TERMINAL_STATUSES),
+                JobGroup.created_at < cutoff,
+                func.coalesce(JobGroup.completed_at, JobGroup.created_at) < cutoff,
+            )
+            .order_by(JobGroup.created_at, JobGroup.id)
+            .limit(batch_size)
+        ))
+        if not group_ids:
+            return 0, 0
+
+        groups, jobs = JobGroup.__table__, Job.__table__
+        group_columns = [column.name for column in groups.columns]
+        job_columns = [column.name for column in jobs.columns]
+        archived_at = literal(datetime.now(timezone.utc).replace(tzinfo=None), DateTime)
+        await db.execute(
+            insert(ArchivedJobGroup.__table__).from_select(
+                group_columns + ["archived_at"],
+                select(*[groups.c[name] for name in group_columns], archived_at).where(groups.c.id.in_(group_ids)),
+            )
+        )
+        archived_jobs = (await db.execute(
+            insert(ArchivedJob.__table__).from_select(
+                job_columns,
+                select(*[jobs.c[name] for name in job_columns]).where(jobs.c.group_id.in_(group_ids)),
+            )
+        )).rowcount
+        await db.execute(delete(jobs).where(jobs.c.group_id.in_(group_ids)))
+        await db.execute(delete(groups).where(groups.c.id.in_(group_ids)))
+        await db.commit()
+        return len(group_ids), archived_jobs
+
+    async def archive_once(self) -> int:
+        if settings.ARCHIVE_AFTER_DAYS <= 0:
+            return 0
+        # timestamps are stored as naive utc
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.ARCHIVE_AFTER_DAYS)).replace(tzinfo=None)
+        total = 0
+        async with AsyncSessionLocal() as db:
+            while True:
+                groups, jobs = await self.archive_batch(db, cutoff, settings.ARCHIVE_BATCH_SIZE)
+                total += groups
+                self.archived_groups += groups
+                self.archived_jobs += jobs
+                if groups < settings.ARCHIVE_BATCH_SIZE:
+                    break
+                # let request handlers at the database between batches
+                await asyncio.sleep(0)
+        self.last_run_at = datetime.now(timezone.utc)
+        if total:
+            logger.info(f"Archived {total} job groups finished before {cutoff.isoformat()}")
+        return total
+
+    async def start(self):
+        self.running = True
+        self._stopped = asyncio.Event()
+        while self.running:
+            try:
+                await self.archive_once()
+            except Exception as e:
+                logger.error(f"Error archiving job groups: {e}")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), settings.ARCHIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        self.running = False
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def get_stats(self):
+        return {
+            "archive_after_days": settings.ARCHIVE_AFTER_DAYS,
+            "archived_groups": self.archived_groups,
+            "archived_jobs": self.archived_jobs,
+            "last_run_at": self.last_run_at,
+        }
+
+archiver = JobArchiver()
@@ -0,0 +1,58 @@
+import math
+from enum import Enum
+from typing import Dict, Optional, Set
+
+class SchedulingPolicy(str, Enum):
+    fifo = "fifo"
+    easy = "easy"
+    conservative = "conservative"
+
+class BackfillPlanner:
+    """Reservation bookkeeping for one scheduler pass.
+
+    Times are seconds relative to the start of the pass. `free_at` holds the
+    expected time each device becomes free (0 for available devices, inf for
+    offline ones). Groups are considered in queue order: a group that cannot
+    start now reserves its devices from the earliest time they are all free,
+    and a group that can start now only runs if it finishes before every
+    reservation on its devices. EASY backfill keeps a single reservation (the
+    head of the queue), conservative backfill gives every blocked group one.
+    """
+
+    def __init__(self, free_at: Dict[int, float], max_reservations: Optional[int]):
+        self.free_at = dict(free_at)
+        self.max_reservations = max_reservations
+        self.reserved_from: Dict[int, float] = {}
+        self.reservations = 0
+
+    @classmethod
+    def for_policy(cls, policy: str, free_at: Dict[int, float]) -> Optional["BackfillPlanner"]:
+        if policy == SchedulingPolicy.easy:
+            return cls(free_at, max_reservations=1)
+        if policy == SchedulingPolicy.conservative:
+            return cls(free_at, max_reservations=None)
+        return None
+
+    def can_start(self, device_ids: Set[int], runtime: float) -> bool:
+        return all(runtime <= self.reserved_from.get(device_id, math.inf) for device_id in device_ids)
+
+    def start(self, device_ids: Set[int], runtime: float):
+        for device_id in device_ids:
+            self.free_at[device_id] = runtime
+
+    def reserve(self, device_ids: Set[int], runtime: float) -> Optional[float]:
+        """Reserve the devices of a blocked group and return its planned start."""
+        start = self.earliest_start(device_ids)
+        if math.isinf(start):
+            # waiting on offline hardware, holding devices for it would only idle them
+            return None
+        if self.max_reservations is not None and self.reservations >= self.max_reservations:
+            return None
+        self.reservations += 1
+        for device_id in device_ids:
+            self.reserved_from[device_id] = min(self.reserved_from.get(device_id, math.inf), start)
+            self.free_at[device_id] = start + runtime
+        return start
+
+    def earliest_start(self, device_ids: Set[int]) -> float:
+        return max((self.free_at.get(device_id, math.inf) for device_id in device_ids), default=0.0)
@@ -0,0 +1,34 @@
+from typing import Dict, Iterable, Set
+
+from ..models.models import DeviceStatus
+
+class DeviceAvailabilityIndex:
+    """In-memory view of device state for a single scheduler pass.
+
+    Built from one set-based query so that checking whether a group can run
+    is a set containment test instead of a round-trip per group.
+    """
+
+    def __init__(self, devices: Iterable):
+        self.status: Dict[int, DeviceStatus] = {}
+        self.gateway_of: Dict[int, int] = {}
+        self.available: Set[int] = set()
+        for device in devices:
+            self.status[device.id] = device.status
+            self.gateway_of[device.id] = device.gateway_id
+            if device.status == DeviceStatus.available:
+                self.available.add(device.id)
+
+    def is_ready(self, device_ids: Set[int]) -> bool:
+        return device_ids <= self.available
+
+    def reserve(self, device_ids: Set[int]):
+        self.available -= device_ids
+        for device_id in device_ids:
+            self.status[device_id] = DeviceStatus.busy
+
+    def release(self, device_ids: Set[int]):
+        for device_id in device_ids:
+            if device_id in self.status:
+                self.status[device_id] = DeviceStatus.available
+                self.available.add(device_id)
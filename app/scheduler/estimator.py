@@ -0,0 +1,69 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import defaultdict
+from datetime import datetime, timezone
+import time
+from typing import Dict, Iterable, Optional
+
+from ..config import settings
+from ..models.models import Job, JobStatus
+
+def as_utc(value: datetime) -> datetime:
+    # sqlite hands back naive datetimes; everything we store is utc
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+class RuntimeEstimator:
+    """Estimates job runtimes from the durations of recently finished jobs.
+
+    Uses the mean duration per device, falling back to the mean over all
+    devices and finally to SCHEDULER_DEFAULT_RUNTIME when there is no history.
+    """
+
+    def __init__(self, sample_size: int = 2000, refresh_interval: float = 60):
+        self.sample_size = sample_size
+        self.refresh_interval = refresh_interval
+        self.device_means: Dict[int, float] = {}
+        self.global_mean: Optional[float] = None
+        self._refreshed_at: Optional[float] = None
+
+    async def refresh(self, db: AsyncSession, force: bool = False):
+        if (
+            not force
+            and self._refreshed_at is not None
+            and time.monotonic() - self._refreshed_at < self.refresh_interval
+        ):
+            return
+        rows = (await db.execute(
+            select(Job.device_id, Job.started_at, Job.completed_at)
+            .where(
+                Job.status == JobStatus.completed,
+                Job.started_at.isnot(None),
+                Job.completed_at.isnot(None),
+            )
+            .order_by(Job.completed_at.desc())
+            .limit(self.sample_size)
+        )).all()
+        durations = defaultdict(list)
+        for device_id, started_at, completed_at in rows:
+            duration = (as_utc(completed_at) - as_utc(started_at)).total_seconds()
+            if duration >= 0:
+                durations[device_id].append(duration)
+        self.device_means = {
+            device_id: sum(values) / len(values) for device_id, values in durations.items()
+        }
+        all_durations = [d for values in durations.values() for d in values]
+        self.global_mean = sum(all_durations) / len(all_durations) if all_durations else None
+        self._refreshed_at = time.monotonic()
+
+    def job_runtime(self, device_id: int) -> float:
+        if device_id in self.device_means:
+            return self.device_means[device_id]
+        if self.global_mean is not None:
+            return self.global_mean
+        return settings.SCHEDULER_DEFAULT_RUNTIME
+
+    def group_runtime(self, device_ids: Iterable[int]) -> float:
+        # the jobs of a group run in parallel, one per device
+        return max((self.job_runtime(device_id) for device_id in device_ids), default=0.0)
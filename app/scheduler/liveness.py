@@ -0,0 +1,316 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, select, update
+
+from ..config import settings
+from ..database import AsyncSessionLocal, SessionLocal
+from ..models.models import Device, DeviceStatus, Gateway
+from ..services.job_service import JobService
+from .estimator import as_utc
+from .notifier import scheduler_notifier
+
+logger = logging.getLogger(__name__)
+
+class LivenessStore:
+    """Keeps gateway and device heartbeats in memory.
+
+    A heartbeat only reaches the database when it changes something: the
+    gateway's reported device set differs from the last one written, or the
+    gateway hasn't been synced for HEARTBEAT_RESYNC_INTERVAL (which also
+    picks up changes made by other API instances). Otherwise its timestamps
+    are recorded here and written every HEARTBEAT_FLUSH_INTERVAL in one
+    batched UPDATE per table, so the last_seen columns lag by at most that.
+
+    It also keeps an expiry index for the liveness monitor: a heap with one
+    entry per gateway, keyed by when its last heartbeat times out. A
+    heartbeat only moves the gateway's deadline; an entry that comes up
+    early is pushed back with the real deadline when popped.
+
+    `record`, `is_synced` and friends are called from the sync route handlers
+    in the threadpool, the flush runs on the event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # last_seen not yet written to the database
+        self._gateways_seen: Dict[int, datetime] = {}
+        self._devices_seen: Dict[int, datetime] = {}
+        # gateway id -> (active device ids as written, monotonic time of the write)
+        self._synced: Dict[int, Tuple[FrozenSet[int], float]] = {}
+        # gateway id -> epoch seconds its last heartbeat times out, and the heap over it
+        self._deadlines: Dict[int, float] = {}
+        self._expiry: List[Tuple[float, int]] = []
+        self.running = False
+        self.heartbeats = 0
+        self.synced_heartbeats = 0
+        self.flushed_rows = 0
+        self.last_flush_at: Optional[datetime] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def is_synced(self, gateway_id: int, active_device_ids: FrozenSet[int]) -> bool:
+        with self._lock:
+            synced = self._synced.get(gateway_id)
+        return (
+            synced is not None
+            and synced[0] == active_device_ids
+            and time.monotonic() - synced[1] < settings.HEARTBEAT_RESYNC_INTERVAL
+        )
+
+    def mark_synced(self, gateway_id: int, active_device_ids: FrozenSet[int], now: datetime):
+        with self._lock:
+            self._synced[gateway_id] = (active_device_ids, time.monotonic())
+            self._watch(gateway_id, now)
+            self.synced_heartbeats += 1
+            self.heartbeats += 1
+
+    def record(self, gateway_id: int, active_device_ids: Iterable[int], now: datetime):
+        with self._lock:
+            self._gateways_seen[gateway_id] = now
+            self._watch(gateway_id, now)
+            for device_id in active_device_ids:
+                self._devices_seen[device_id] = now
+            self.heartbeats += 1
+
+    def _watch(self, gateway_id: int, seen_at: datetime):
+        deadline = seen_at.timestamp() + settings.GATEWAY_TIMEOUT
+        if gateway_id not in self._deadlines:
+            heapq.heappush(self._expiry, (deadline, gateway_id))
+            self._deadlines[gateway_id] = deadline
+        else:
+            self._deadlines[gateway_id] = max(self._deadlines[gateway_id], deadline)
+
+    def watch(self, gateway_id: int, seen_at: datetime):
+        with self._lock:
+            self._watch(gateway_id, seen_at)
+
+    def expired(self, now: datetime) -> List[int]:
+        """Pops the gateways whose last heartbeat timed out by `now`."""
+        now = now.timestamp()
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, gateway_id = heapq.heappop(self._expiry)
+                deadline = self._deadlines[gateway_id]
+                if deadline > now:
+                    heapq.heappush(self._expiry, (deadline, gateway_id))
+                else:
+                    del self._deadlines[gateway_id]
+                    expired.append(gateway_id)
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        with self._lock:
+            return self._expiry[0][0] if self._expiry else None
+
+    def forget(self, gateway_id: int):
+        # the gateway's statuses were changed elsewhere, sync its next heartbeat
+        with self._lock:
+            self._synced.pop(gateway_id, None)
+
+    def on_scheduler_event(self, reason: str):
+        # a monitor on any instance took these gateways offline; pub/sub can drop
+        # a message, the resync interval bounds how long that goes unnoticed
+        kind, _, gateway_ids = reason.partition(":")
+        if kind == "gateway_offline":
+            for gateway_id in gateway_ids.split(","):
+                self.forget(int(gateway_id))
+
+    async def flush(self) -> int:
+        with self._lock:
+            gateways_seen, self._gateways_seen = self._gateways_seen, {}
+            devices_seen, self._devices_seen = self._devices_seen, {}
+        if not gateways_seen and not devices_seen:
+            return 0
+        try:
+            async with AsyncSessionLocal() as db:
+                for table, seen in ((Gateway.__table__, gateways_seen), (Device.__table__, devices_seen)):
+                    if seen:
+                        # rows deleted in the meantime just match nothing
+                        await db.execute(
+                            update(table)
+                            .where(table.c.id == bindparam("row_id"))
+                            .values(last_seen=bindparam("seen_at")),
+                            [{"row_id": row_id, "seen_at": seen_at} for row_id, seen_at in seen.items()],
+                        )
+                await db.commit()
+        except Exception:
+            # keep the timestamps for the next flush unless newer ones arrived
+            with self._lock:
+                for pending, seen in ((self._gateways_seen, gateways_seen), (self._devices_seen, devices_seen)):
+                    for row_id, seen_at in seen.items():
+                        pending.setdefault(row_id, seen_at)
+            raise
+        rows = len(gateways_seen) + len(devices_seen)
+        self.flushed_rows += rows
+        self.last_flush_at = datetime.now(timezone.utc)
+        return rows
+
+    async def start(self):
+        self.running = True
+        self._stopped = asyncio.Event()
+        while self.running:
+            try:
+                await asyncio.wait_for(self._stopped.wait(), settings.HEARTBEAT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing heartbeats: {e}")
+
+    async def stop(self):
+        self.running = False
+        if self._stopped is not None:
+            self._stopped.set()
+        # don't lose the last interval's heartbeats on shutdown
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing heartbeats: {e}")
+
+    def get_stats(self):
+        return {
+            "heartbeats": self.heartbeats,
+            "synced_heartbeats": self.synced_heartbeats,
+            "flushed_rows": self.flushed_rows,
+            "pending_gateways": len(self._gateways_seen),
+            "pending_devices": len(self._devices_seen),
+            "watched_gateways": len(self._deadlines),
+            "last_flush_at": self.last_flush_at,
+        }
+
+liveness_store = LivenessStore()
+scheduler_notifier.add_listener(liveness_store.on_scheduler_event)
+
+class LivenessMonitor:
+    """Takes gateways offline once their heartbeats stop.
+
+    A gateway is due when GATEWAY_TIMEOUT has passed since the last heartbeat
+    this instance saw, as kept by the store's expiry index, so a sweep only
+    looks at gateways that are due. Gateways this instance never heard from
+    are picked up from the database once their last_seen is that old, an
+    index range scan every GATEWAY_TIMEOUT. The database has the final say:
+    a gateway that heartbeated through another instance has a newer
+    last_seen and is watched again from there. A dead gateway and its
+    devices are set offline in bulk and the jobs they were preparing or
+    running are failed, so the scheduler stops spending capacity on them.
+    The gateway's next heartbeat brings it back, on whichever instance it
+    lands: the sweep is broadcast so every liveness store forgets the
+    gateway's sync state.
+    """
+
+    def __init__(self, store: LivenessStore):
+        self.store = store
+        self.running = False
+        self.offline_gateways = 0
+        self.failed_jobs = 0
+        self.last_sweep_at: Optional[datetime] = None
+        self._seeded_at: Optional[float] = None
+        self._stopped: Optional[asyncio.Event] = None
+
+    def _seed(self, db, cutoff: datetime):
+        # online gateways this instance hasn't heard from lately, e.g. right after a restart
+        for gateway_id, last_seen in db.execute(
+            select(Gateway.id, Gateway.last_seen)
+            .where(Gateway.last_seen < cutoff, Gateway.status != DeviceStatus.offline)
+        ):
+            self.store.watch(gateway_id, as_utc(last_seen))
+        self._seeded_at = time.monotonic()
+
+    def sweep_once(self, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now(timezone.utc)
+        # timestamps are stored as naive utc
+        cutoff = (now - timedelta(seconds=settings.GATEWAY_TIMEOUT)).replace(tzinfo=None)
+        db = SessionLocal()
+        try:
+            if self._seeded_at is None or time.monotonic() - self._seeded_at >= settings.GATEWAY_TIMEOUT:
+                self._seed(db, cutoff)
+            gateway_ids = self.store.expired(now)
+            if not gateway_ids:
+                return 0
+
+            offline_ids = db.scalars(
+                update(Gateway)
+                .where(
+                    Gateway.id.in_(gateway_ids),
+                    Gateway.status != DeviceStatus.offline,
+                    Gateway.last_seen < cutoff,
+                )
+                .values(status=DeviceStatus.offline)
+                .returning(Gateway.id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            device_ids = []
+            if offline_ids:
+                device_ids = db.scalars(select(Device.id).where(Device.gateway_id.in_(offline_ids))).all()
+                db.execute(
+                    update(Device)
+                    .where(Device.gateway_id.in_(offline_ids), Device.status != DeviceStatus.offline)
+                    .values(status=DeviceStatus.offline)
+                    .execution_options(synchronize_session=False)
+                )
+            # heard from through another instance since
+            alive_ids = set(gateway_ids) - set(offline_ids)
+            if alive_ids:
+                for gateway_id, last_seen in db.execute(
+                    select(Gateway.id, Gateway.last_seen)
+                    .where(Gateway.id.in_(alive_ids), Gateway.status != DeviceStatus.offline)
+                ):
+                    self.store.watch(gateway_id, as_utc(last_seen))
+            db.commit()
+
+            if not offline_ids:
+                return 0
+            # every instance forgets them, so their next heartbeat brings them back wherever it lands
+            for gateway_id in offline_ids:
+                self.store.forget(gateway_id)
+            results = JobService.fail_device_jobs_service(device_ids, db)
+        finally:
+            db.close()
+            self.last_sweep_at = now
+
+        failed = sum(1 for result in results if result["ok"])
+        self.offline_gateways += len(offline_ids)
+        self.failed_jobs += failed
+        logger.warning(f"Gateways {offline_ids} stopped sending heartbeats, set offline and failed {failed} jobs")
+        scheduler_notifier.notify(f"gateway_offline:{','.join(map(str, offline_ids))}")
+        return len(offline_ids)
+
+    async def start(self):
+        self.running = True
+        self._stopped = asyncio.Event()
+        while self.running:
+            try:
+                await asyncio.to_thread(self.sweep_once)
+            except Exception as e:
+                logger.error(f"Error sweeping gateway liveness: {e}")
+            # heartbeats only move deadlines later, so nothing is due before the earliest one
+            timeout = settings.GATEWAY_TIMEOUT
+            next_deadline = self.store.next_deadline()
+            if next_deadline is not None:
+                timeout = min(timeout, max(next_deadline - time.time(), 0) + 0.1)
+            try:
+                await asyncio.wait_for(self._stopped.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        self.running = False
+        if self._stopped is not None:
+            self._stopped.set()
+
+    def get_stats(self):
+        return {
+            "gateway_timeout": settings.GATEWAY_TIMEOUT,
+            "offline_gateways": self.offline_gateways,
+            "failed_jobs": self.failed_jobs,
+            "last_sweep_at": self.last_sweep_at,
+        }
+
+liveness_monitor = LivenessMonitor(liveness_store)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, List, Optional
+
+from ..queue.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+class SchedulerNotifier:
+    """Wakes the scheduler when something it cares about changes.
+
+    `notify` is safe to call from the sync route handlers (which run in the
+    threadpool) as well as from the event loop. Events are fanned out to the
+    other API instances over redis pub/sub so every scheduler wakes up.
+    Callbacks added with `add_listener` see the reason of every event, local
+    or remote, on the event loop.
+    """
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event: Optional[asyncio.Event] = None
+        # monotonic time of the oldest event not yet consumed by the scheduler
+        self._raised_at: Optional[float] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._listening = False
+        self._callbacks: List[Callable[[str], None]] = []
+
+    def add_listener(self, callback: Callable[[str], None]):
+        self._callbacks.append(callback)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self, reason: str, broadcast: bool = True):
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._wake, reason, broadcast)
+
+    def _wake(self, reason: str, broadcast: bool):
+        if self._raised_at is None:
+            self._raised_at = time.monotonic()
+        self._event.set()
+        for callback in self._callbacks:
+            try:
+                callback(reason)
+            except Exception as e:
+                logger.error(f"Error handling scheduler event '{reason}': {e}")
+        if broadcast:
+            asyncio.ensure_future(self._broadcast(reason))
+
+    async def _broadcast(self, reason: str):
+        try:
+            await redis_client.publish_scheduler_event(self.instance_id, reason)
+        except Exception as e:
+            logger.warning(f"Could not broadcast scheduler event '{reason}': {e}")
+
+    async def wait(self, timeout: float) -> Optional[float]:
+        """Block until notified or `timeout` elapses.
+
+        Returns the monotonic time the oldest pending event was raised, or
+        None if the wait ended on the timeout (periodic sweep).
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._event.clear()
+        raised_at, self._raised_at = self._raised_at, None
+        return raised_at
+
+    async def listen(self):
+        while self._listening:
+            pubsub = redis_client.scheduler_events_pubsub()
+            try:
+                await pubsub.subscribe(redis_client.SCHEDULER_EVENTS_CHANNEL)
+                while self._listening:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    origin, _, reason = message["data"].partition(":")
+                    if origin != self.instance_id:
+                        self._wake(reason, False)
+            except Exception as e:
+                logger.warning(f"Scheduler event subscription lost: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    def start_listener(self):
+        self._listening = True
+        self._listener = asyncio.create_task(self.listen())
+
+    async def stop_listener(self):
+        self._listening = False
+        if self._listener is not None:
+            try:
+                await asyncio.wait_for(self._listener, 5)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._listener = None
+
+scheduler_notifier = SchedulerNotifier()
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import math
+import uuid
+import zlib
+from typing import Callable, Optional, Set
+
+from ..queue.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+class ShardLeaseManager:
+    """Splits gateways into shards and holds redis leases on a fair share of them.
+
+    Every instance registers itself in a redis sorted set with an expiry and
+    aims to own ceil(shards / live instances) shards. Leases are renewed every
+    third of their ttl, so when an instance dies its shards become free once
+    the ttl lapses and the survivors pick them up on their next rebalance.
+    """
+
+    def __init__(self, shard_count: int, lease_ttl: float, on_acquire: Optional[Callable[[], None]] = None):
+        self.instance_id = uuid.uuid4().hex
+        self.shard_count = max(1, shard_count)
+        self.lease_ttl = lease_ttl
+        self.on_acquire = on_acquire
+        self.owned: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def shard_of_gateway(self, gateway_id: int) -> int:
+        return gateway_id % self.shard_count
+
+    def owns_gateway(self, gateway_id: int) -> bool:
+        return self.shard_of_gateway(gateway_id) in self.owned
+
+    def _lease_key(self, shard: int) -> str:
+        return f"scheduler:shard:{shard}"
+
+    async def rebalance(self):
+        ttl_ms = int(self.lease_ttl * 1000)
+        live_instances = await redis_client.heartbeat_scheduler_instance(self.instance_id, self.lease_ttl)
+        target = math.ceil(self.shard_count / max(1, live_instances))
+
+        for shard in sorted(self.owned):
+            if not await redis_client.renew_lease(self._lease_key(shard), self.instance_id, ttl_ms):
+                logger.warning(f"Lost lease on scheduler shard {shard}")
+                self.owned.discard(shard)
+
+        while len(self.owned) > target:
+            shard = max(self.owned)
+            await redis_client.release_lease(self._lease_key(shard), self.instance_id)
+            self.owned.discard(shard)
+            logger.info(f"Released scheduler shard {shard}")
+
+        acquired = False
+        # start probing at a per-instance offset so instances don't all race for shard 0
+        offset = zlib.crc32(self.instance_id.encode()) % self.shard_count
+        for i in range(self.shard_count):
+            if len(self.owned) >= target:
+                break
+            shard = (offset + i) % self.shard_count
+            if shard in self.owned:
+                continue
+            if await redis_client.acquire_lease(self._lease_key(shard), self.instance_id, ttl_ms):
+                self.owned.add(shard)
+                acquired = True
+                logger.info(f"Acquired scheduler shard {shard}")
+
+        if acquired and self.on_acquire is not None:
+            self.on_acquire()
+
+    async def run(self):
+        while True:
+            try:
+                await self.rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error rebalancing scheduler shards: {e}")
+            await asyncio.sleep(self.lease_ttl / 3)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for shard in list(self.owned):
+            try:
+                await redis_client.release_lease(self._lease_key(shard), self.instance_id)
+            except Exception as e:
+                logger.warning(f"Could not release scheduler shard {shard}: {e}")
+        self.owned.clear()
+        try:
+            await redis_client.unregister_scheduler_instance(self.instance_id)
+        except Exception as e:
+            logger.warning(f"Could not unregister scheduler instance: {e}")
@@ -1,82 +1,459 @@
-from sqlalchemy.orm import Session
-from datetime import datetime, timezone
+from sqlalchemy import delete, insert, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict, deque
 import asyncio
 import logging
-from typing import List
+import math
+import time
+from typing import Dict, List, Optional, Set
 
-from ..database import SessionLocal
-from ..models.models import JobGroup, Job, Device, JobStatus, DeviceStatus
+from ..config import settings
+from ..database import AsyncSessionLocal
+from ..models.models import DispatchOutbox, JobGroup, Job, Device, JobStatus, DeviceStatus
 from ..queue.redis_client import redis_client
+from ..queue.job_events import job_events
+from .backfill import BackfillPlanner, SchedulingPolicy
+from .device_index import DeviceAvailabilityIndex
+from .estimator import RuntimeEstimator, as_utc
+from .notifier import scheduler_notifier
+from .partition import ShardLeaseManager
 
 logger = logging.getLogger(__name__)
 
+def _percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
 class JobScheduler:
-    def __init__(self):
+    def __init__(self, notifier=scheduler_notifier):
         self.running = False
-        self.check_interval = 5  # seconds
+        self.check_interval = settings.SCHEDULER_SWEEP_INTERVAL  # seconds
+        self.notifier = notifier
+        # monotonic time of the event that triggered the current pass
+        self._raised_at: Optional[float] = None
+        self.dispatch_latencies = deque(maxlen=1000)
+        self.pass_durations = deque(maxlen=1000)
+        self.passes = {"event": 0, "sweep": 0}
+        self.dispatched_groups = 0
+        self.policy = SchedulingPolicy(settings.SCHEDULER_POLICY)
+        self.estimator = RuntimeEstimator()
+        # per policy: time-weighted device utilization and group queue waits
+        self.policy_stats = {}
+        self._utilization_sample = None
+        # monotonic time the queue estimates were last published, shard 0's owner only
+        self._estimated_at: Optional[float] = None
+        self.estimate_durations = deque(maxlen=1000)
+        # monotonic time of the last outbox reconcile, shard 0's owner only
+        self._reconciled_at: Optional[float] = None
+        self.released_dispatches = 0
+        self.leases = ShardLeaseManager(
+            settings.SCHEDULER_SHARDS,
+            settings.SCHEDULER_LEASE_TTL,
+            on_acquire=lambda: self.notifier.notify("shard_acquired", broadcast=False),
+        )
 
     async def start(self):
         self.running = True
+        self.notifier.bind(asyncio.get_running_loop())
+        self.notifier.start_listener()
+        self.leases.start()
         while self.running:
             try:
                 await self.check_and_dispatch_jobs()
             except Exception as e:
                 logger.error(f"Error in job scheduler: {e}")
-            await asyncio.sleep(self.check_interval)
-    
+            self._raised_at = await self.notifier.wait(self.check_interval)
+            self.passes["event" if self._raised_at is not None else "sweep"] += 1
+
     async def stop(self):
         self.running = False
-    
+        await self.notifier.stop_listener()
+        await self.leases.stop()
+
+    def get_stats(self):
+        latencies = list(self.dispatch_latencies)
+        durations = list(self.pass_durations)
+        return {
+            "passes": dict(self.passes),
+            "dispatched_groups": self.dispatched_groups,
+            "released_dispatches": self.released_dispatches,
+            "dispatch_latency_ms": {
+                "p50": _percentile(latencies, 0.5),
+                "p95": _percentile(latencies, 0.95),
+                "max": max(latencies) if latencies else None,
+            },
+            "pass_duration_ms": {
+                "p50": _percentile(durations, 0.5),
+                "p95": _percentile(durations, 0.95),
+                "max": max(durations) if durations else None,
+            },
+            "estimate_duration_ms": {
+                "p50": _percentile(list(self.estimate_durations), 0.5),
+                "max": max(self.estimate_durations) if self.estimate_durations else None,
+            },
+            "policy": self.policy.value,
+            "owned_shards": sorted(self.leases.owned),
+            "policies": {
+                policy: {
+                    "device_utilization": (
+                        stats["busy_seconds"] / stats["observed_seconds"]
+                        if stats["observed_seconds"] else None
+                    ),
+                    "group_wait_s": {
+                        "p50": _percentile(list(stats["group_waits"]), 0.5),
+                        "p95": _percentile(list(stats["group_waits"]), 0.95),
+                    },
+                }
+                for policy, stats in self.policy_stats.items()
+            },
+        }
+
+    def _stats_for_policy(self):
+        if self.policy.value not in self.policy_stats:
+            self.policy_stats[self.policy.value] = {
+                "busy_seconds": 0.0,
+                "observed_seconds": 0.0,
+                "group_waits": deque(maxlen=1000),
+            }
+        return self.policy_stats[self.policy.value]
+
+    async def _record_utilization(self, db: AsyncSession):
+        # integrate the busy fraction of online devices over time between passes
+        counts = dict((await db.execute(
+            select(Device.status, func.count(Device.id)).group_by(Device.status)
+        )).all())
+        online = counts.get(DeviceStatus.available, 0) + counts.get(DeviceStatus.busy, 0)
+        utilization = counts.get(DeviceStatus.busy, 0) / online if online else 0.0
+        now = time.monotonic()
+        if self._utilization_sample is not None:
+            sampled_at, previous = self._utilization_sample
+            stats = self._stats_for_policy()
+            stats["busy_seconds"] += previous * (now - sampled_at)
+            stats["observed_seconds"] += now - sampled_at
+        self._utilization_sample = (now, utilization)
+
+    def _owns_group(self, device_ids, index: DeviceAvailabilityIndex) -> bool:
+        # same rule as the owned-only query in _pending_groups
+        gateway_ids = [index.gateway_of[device_id] for device_id in device_ids]
+        if not gateway_ids:
+            return 0 in self.leases.owned
+        return self.leases.owns_gateway(min(gateway_ids))
+
+    def _pending_groups(self, owned_only: bool):
+        query = (
+            select(JobGroup.id, JobGroup.user_id, JobGroup.created_at)
+            .where(JobGroup.status == JobStatus.pending)
+            .order_by(JobGroup.created_at, JobGroup.id)
+        )
+        if not owned_only:
+            return query
+        # a group spanning gateways belongs to the shard of its lowest gateway id,
+        # a group without jobs to shard 0
+        lowest_gateway = func.coalesce(func.min(Device.gateway_id), 0)
+        return (
+            query
+            .outerjoin(Job, Job.group_id == JobGroup.id)
+            .outerjoin(Device, Device.id == Job.device_id)
+            .group_by(JobGroup.id, JobGroup.user_id, JobGroup.created_at)
+            .having((lowest_gateway % self.leases.shard_count).in_(sorted(self.leases.owned)))
+        )
+
+    async def _device_free_at(self, db: AsyncSession, index: DeviceAvailabilityIndex, pending_device_ids) -> dict:
+        # seconds from now until each device is expected to be free
+        now = datetime.now(timezone.utc)
+        free_at = {}
+        for device_id, status in index.status.items():
+            if status == DeviceStatus.available:
+                free_at[device_id] = 0.0
+            elif status == DeviceStatus.offline:
+                free_at[device_id] = math.inf
+            else:
+                free_at[device_id] = self.estimator.job_runtime(device_id)
+        running = (await db.execute(
+            select(Job.device_id, Job.started_at)
+            .where(Job.status == JobStatus.running, Job.device_id.in_(pending_device_ids))
+        )).all()
+        for device_id, started_at in running:
+            if started_at is None or index.status.get(device_id) != DeviceStatus.busy:
+                continue
+            elapsed = (now - as_utc(started_at)).total_seconds()
+            free_at[device_id] = max(0.0, self.estimator.job_runtime(device_id) - elapsed)
+        return free_at
+
+    async def _load_queue(self, db: AsyncSession, owned_only: bool):
+        # plain rows rather than ORM objects, so commits during dispatch
+        # don't expire them and trigger reloads
+        pending_groups = (await db.execute(self._pending_groups(owned_only))).all()
+        if not pending_groups:
+            return [], {}, DeviceAvailabilityIndex([]), set()
+
+        # one query each for the jobs and devices of the groups, regardless of queue depth
+        jobs_by_group = defaultdict(list)
+        jobs = (await db.execute(
+            select(Job.id, Job.group_id, Job.device_id)
+            .where(Job.group_id.in_([group.id for group in pending_groups]))
+        )).all()
+        for job in jobs:
+            jobs_by_group[job.group_id].append(job)
+        pending_device_ids = {job.device_id for job in jobs}
+        devices = (await db.execute(
+            select(Device.id, Device.status, Device.gateway_id)
+            .where(Device.id.in_(pending_device_ids))
+        )).all()
+        return pending_groups, jobs_by_group, DeviceAvailabilityIndex(devices), pending_device_ids
+
+    def _can_start(self, device_ids, runtime: float, index: DeviceAvailabilityIndex, planner) -> bool:
+        return index.is_ready(device_ids) and (planner is None or planner.can_start(device_ids, runtime))
+
     async def check_and_dispatch_jobs(self):
-        db: Session = SessionLocal()
+        if not self.leases.owned:
+            # every pending group belongs to another instance
+            return
+        pass_started = time.monotonic()
+        db: AsyncSession = AsyncSessionLocal()
         try:
-            pending_groups = (
-                db.query(JobGroup)
-                .filter(JobGroup.status == JobStatus.pending)
-                .order_by(JobGroup.created_at)
-                .all()
-            )
-            
-            for group in pending_groups:
-                jobs = db.query(Job).filter(Job.group_id == group.id).all()
-                device_ids = [job.device_id for job in jobs]
-                devices = db.query(Device).filter(Device.id.in_(device_ids)).all()
-                if all(device.status == DeviceStatus.available for device in devices):
-                    await self.dispatch_job_group(db, group, jobs, devices)
+            await self._record_utilization(db)
+            await self.estimator.refresh(db)
+            if 0 in self.leases.owned and (
+                self._reconciled_at is None
+                or time.monotonic() - self._reconciled_at >= settings.SCHEDULER_DISPATCH_TIMEOUT
+            ):
+                await self.reconcile_dispatches(db)
+            # backfill reservations hold devices across shards, so those policies plan
+            # the whole queue and only dispatch what they own; fifo reserves nothing
+            owned_only = self.policy == SchedulingPolicy.fifo
+            pending_groups, jobs_by_group, index, pending_device_ids = await self._load_queue(db, owned_only)
+            if pending_groups:
+                free_at = await self._device_free_at(db, index, pending_device_ids)
+                planner = BackfillPlanner.for_policy(self.policy, free_at)
+                for group in pending_groups:
+                    jobs = jobs_by_group.get(group.id, [])
+                    device_ids = {job.device_id for job in jobs}
+                    runtime = self.estimator.group_runtime(device_ids)
+                    if not self._can_start(device_ids, runtime, index, planner):
+                        if planner is not None:
+                            planner.reserve(device_ids, runtime)
+                        continue
+                    if not owned_only and not self._owns_group(device_ids, index):
+                        # the owning instance will dispatch it, plan as if it had
+                        dispatched = True
+                    else:
+                        dispatched = await self.dispatch_job_group(db, group, jobs, index.gateway_of)
+                    if dispatched:
+                        index.reserve(device_ids)
+                        if planner is not None:
+                            planner.start(device_ids, runtime)
+
+            if 0 in self.leases.owned and (
+                self._estimated_at is None
+                or time.monotonic() - self._estimated_at >= settings.SCHEDULER_ESTIMATE_INTERVAL
+            ):
+                await self.publish_queue_estimates(db)
         finally:
-            db.close()
-    
-    async def dispatch_job_group(self, db: Session, group: JobGroup, jobs: List[Job], devices: List[Device]):
+            await db.close()
+            self.pass_durations.append((time.monotonic() - pass_started) * 1000)
+
+    async def reconcile_dispatches(self, db: AsyncSession):
+        """Repairs dispatches whose scheduler died between the commit and the push.
+
+        An outbox row older than SCHEDULER_DISPATCH_TIMEOUT belongs to a
+        dispatch that never finished. If the push's marker is in redis its
+        jobs were queued and only the row is left to delete, otherwise the
+        group goes back to the queue with its devices. Only the owner of
+        shard 0 runs this.
+        """
+        self._reconciled_at = time.monotonic()
+        # timestamps are stored as naive utc
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=settings.SCHEDULER_DISPATCH_TIMEOUT)).replace(tzinfo=None)
+        group_ids = (await db.scalars(
+            select(DispatchOutbox.group_id).where(DispatchOutbox.created_at < cutoff)
+        )).all()
+        for group_id in group_ids:
+            try:
+                pushed = await redis_client.was_dispatched(group_id)
+            except Exception as e:
+                logger.error(f"Error checking dispatch of job group {group_id}: {e}")
+                return
+            if pushed:
+                await db.execute(delete(DispatchOutbox).where(DispatchOutbox.group_id == group_id))
+                await db.commit()
+                continue
+            device_ids = set((await db.scalars(select(Job.device_id).where(Job.group_id == group_id))).all())
+            if await self._release_job_group(db, group_id, device_ids):
+                logger.warning(f"Jobs of job group {group_id} never reached redis, returned it to the queue")
+                self.released_dispatches += 1
+
+    async def publish_queue_estimates(self, db: AsyncSession):
+        """Plans the whole queue and publishes each waiting group's position and estimated start.
+
+        Positions span every shard, so only the owner of shard 0 runs this,
+        at most every SCHEDULER_ESTIMATE_INTERVAL. Groups that could start now
+        are assumed to be dispatched by their owners.
+        """
+        started = time.monotonic()
+        self._estimated_at = started
+        pending_groups, jobs_by_group, index, pending_device_ids = await self._load_queue(db, owned_only=False)
+        free_at = await self._device_free_at(db, index, pending_device_ids) if pending_groups else {}
+        planner = BackfillPlanner.for_policy(self.policy, free_at)
+        # forward simulation of the whole queue, reserving for every blocked group
+        forecast = BackfillPlanner(free_at, max_reservations=None)
+        now = datetime.now(timezone.utc)
+        estimates = {}
+        for group in pending_groups:
+            device_ids = {job.device_id for job in jobs_by_group.get(group.id, [])}
+            runtime = self.estimator.group_runtime(device_ids)
+            if self._can_start(device_ids, runtime, index, planner):
+                index.reserve(device_ids)
+                if planner is not None:
+                    planner.start(device_ids, runtime)
+                forecast.start(device_ids, runtime)
+                continue
+            if planner is not None:
+                planner.reserve(device_ids, runtime)
+            start = forecast.reserve(device_ids, runtime)
+            estimates[group.id] = {
+                "queue_position": len(estimates) + 1,
+                "estimated_start": (now + timedelta(seconds=start)).isoformat() if start is not None else None,
+            }
         try:
-            for device in devices:
-                device.status = DeviceStatus.busy
-            group.status = JobStatus.running
-            group.started_at = datetime.now(timezone.utc)
-
-            for job in jobs:
-                job.status = JobStatus.running
-                job.started_at = datetime.now(timezone.utc)
-                job_data = {
-                    "job_id": job.id,
-                    "group_id": job.group_id,
-                    "device_id": job.device_id
-                }
-                matching_device = next(device for device in devices if device.id == job.device_id)
-                await redis_client.push_job(matching_device.gateway_id, job_data)
+            # outlives a few missed refreshes, so estimates vanish rather than go stale with their publisher
+            ttl = 3 * max(settings.SCHEDULER_ESTIMATE_INTERVAL, settings.SCHEDULER_SWEEP_INTERVAL)
+            await redis_client.set_queue_estimates(estimates, ttl)
+        except Exception as e:
+            logger.error(f"Error publishing queue estimates: {e}")
+        self.estimate_durations.append((time.monotonic() - started) * 1000)
 
-            db.commit()
-            logger.info(f"Dispatched job group {group.id}")
-        
+    async def dispatch_job_group(self, db: AsyncSession, group, jobs: list, gateway_of: Dict[int, int]) -> bool:
+        device_ids = {job.device_id for job in jobs}
+        started_at = datetime.now(timezone.utc)
+        try:
+            # compare-and-swap the group and its devices so that concurrent
+            # schedulers can never dispatch a group twice or double-book a device
+            claimed = (await db.execute(
+                update(JobGroup)
+                .where(JobGroup.id == group.id, JobGroup.status == JobStatus.pending)
+                .values(
+                    status=JobStatus.running,
+                    started_at=started_at,
+                    jobs_running=JobGroup.jobs_running + JobGroup.jobs_pending,
+                    jobs_pending=0,
+                )
+            )).rowcount
+            if claimed != 1:
+                await db.rollback()
+                logger.info(f"Job group {group.id} was already taken by another scheduler")
+                return False
+            reserved = (await db.execute(
+                update(Device)
+                .where(Device.id.in_(device_ids), Device.status == DeviceStatus.available)
+                .values(status=DeviceStatus.busy)
+            )).rowcount
+            if reserved != len(device_ids):
+                await db.rollback()
+                logger.info(f"Devices for job group {group.id} were taken concurrently, retrying later")
+                return False
+            await db.execute(
+                update(Job)
+                .where(Job.group_id == group.id, Job.status == JobStatus.pending)
+                .values(status=JobStatus.running, started_at=started_at)
+            )
+            # until the push below is done, a crash would strand the group as running
+            await db.execute(insert(DispatchOutbox).values(group_id=group.id, created_at=started_at))
+            await db.commit()
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"Error dispatching job group {group.id}: {e}")
-            for device in devices:
-                device.status = DeviceStatus.available
-            group.status = JobStatus.failed
-            group.completed_at = datetime.now(timezone.utc)
-            for job in jobs:
-                job.status = JobStatus.failed
-                job.completed_at = datetime.now(timezone.utc)
-            db.commit()
+            completed_at = datetime.now(timezone.utc)
+            failed = (await db.execute(
+                update(JobGroup)
+                .where(JobGroup.id == group.id, JobGroup.status == JobStatus.pending)
+                .values(
+                    status=JobStatus.failed,
+                    completed_at=completed_at,
+                    jobs_failed=JobGroup.jobs_total,
+                    **{f"jobs_{status.value}": 0 for status in JobStatus if status != JobStatus.failed},
+                )
+            )).rowcount
+            if failed:
+                await db.execute(
+                    update(Job)
+                    .where(Job.group_id == group.id)
+                    .values(status=JobStatus.failed, completed_at=completed_at)
+                )
+            await db.commit()
+            if failed:
+                job_events.publish("group", group.user_id, group.id, JobStatus.failed)
+            return False
+
+        # publish only once the reservation is durable, in one MULTI per dispatch
+        # with a single multi-value LPUSH per gateway
+        jobs_by_gateway = defaultdict(list)
+        for job in jobs:
+            jobs_by_gateway[gateway_of[job.device_id]].append({
+                "job_id": job.id,
+                "group_id": group.id,
+                "device_id": job.device_id
+            })
+        try:
+            await redis_client.push_jobs(jobs_by_gateway, group.id, 10 * settings.SCHEDULER_DISPATCH_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error queueing job group {group.id}, returning it to the queue: {e}")
+            await self._release_job_group(db, group.id, device_ids)
+            return False
+        try:
+            await db.execute(delete(DispatchOutbox).where(DispatchOutbox.group_id == group.id))
+            await db.commit()
+        except Exception as e:
+            # the reconcile finds the marker and deletes the row later
+            await db.rollback()
+            logger.warning(f"Error clearing dispatch outbox for job group {group.id}: {e}")
+
+        job_events.publish("group", group.user_id, group.id, JobStatus.running)
+        self.dispatched_groups += 1
+        self._stats_for_policy()["group_waits"].append(
+            (started_at - as_utc(group.created_at)).total_seconds()
+        )
+        if self._raised_at is not None:
+            latency_ms = (time.monotonic() - self._raised_at) * 1000
+            self.dispatch_latencies.append(latency_ms)
+            logger.info(f"Dispatched job group {group.id} ({latency_ms:.1f} ms after wakeup event)")
+        else:
+            logger.info(f"Dispatched job group {group.id}")
+        return True
+
+    async def _release_job_group(self, db: AsyncSession, group_id: int, device_ids: Set[int]) -> bool:
+        # undo a dispatch whose jobs never reached redis
+        try:
+            released = (await db.execute(
+                update(JobGroup)
+                .where(JobGroup.id == group_id, JobGroup.status == JobStatus.running)
+                .values(
+                    status=JobStatus.pending,
+                    started_at=None,
+                    jobs_pending=JobGroup.jobs_pending + JobGroup.jobs_running,
+                    jobs_running=0,
+                )
+            )).rowcount
+            if released:
+                await db.execute(
+                    update(Job)
+                    .where(Job.group_id == group_id, Job.status == JobStatus.running)
+                    .values(status=JobStatus.pending, started_at=None)
+                )
+                await db.execute(
+                    update(Device)
+                    .where(Device.id.in_(device_ids), Device.status == DeviceStatus.busy)
+                    .values(status=DeviceStatus.available)
+                )
+            await db.execute(delete(DispatchOutbox).where(DispatchOutbox.group_id == group_id))
+            await db.commit()
+            return bool(released)
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error releasing job group {group_id}: {e}")
+            return False
 
 scheduler = JobScheduler()
\ No newline at end of file
@@ -66,6 +66,13 @@ class JobStatusUpdate(BaseModel):
     status: JobStatus
     output_file_id: Optional[int] = None
 
+class JobStatusBatchItem(JobStatusUpdate):
+    job_id: int
+
+class JobStatusBatch(BaseModel):
+    # applied in order, so one job may appear several times
+    updates: List[JobStatusBatchItem] = Field(..., min_length=1, max_length=1000)
+
 class JobSchema(BaseModel):
     id: int
     source_file_id: int
@@ -85,6 +92,9 @@ class JobGroupCreate(BaseModel):
     name: str
     jobs: List[JobCreate]
 
+class JobGroupBulkCreate(BaseModel):
+    groups: List[JobGroupCreate] = Field(..., min_length=1, max_length=500)
+
 class JobGroupSchema(BaseModel):
     id: int
     name: str
@@ -102,6 +112,8 @@ class JobGroupSchema(BaseModel):
 class FileSchema(BaseModel):
     id: int
     filename: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
     created_at: datetime
 
     class Config:
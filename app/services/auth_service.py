@@ -1,16 +1,26 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Dict, Optional, Tuple, Union
+import logging
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 
 from ..models.models import User
+from ..schemas.schemas import UserSchema
+from ..queue.redis_client import redis_client
 from ..config import settings
 
+logger = logging.getLogger(__name__)
+
 class AuthService:
 
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    # user id -> (token version, monotonic expiry), saves a redis round trip per request
+    _token_versions: Dict[int, Tuple[int, float]] = {}
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -36,6 +46,16 @@ class AuthService:
             return None
         return user
 
+    @staticmethod
+    def user_claims(user: User, token_version: int) -> dict:
+        # everything get_current_user_async needs, so requests don't have to load the user
+        return {
+            "sub": user.username,
+            "uid": user.id,
+            "created_at": user.created_at.isoformat(),
+            "ver": token_version,
+        }
+
     @staticmethod
     def create_access_token(data: dict) -> str:
         to_encode = data.copy()
@@ -44,21 +64,65 @@ class AuthService:
         return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
 
     @staticmethod
-    def get_current_user(db: Session, token: str) -> User:
-        credentials_exception = HTTPException(
+    def _credentials_exception() -> HTTPException:
+        return HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    @staticmethod
+    def _decode_token(token: str) -> dict:
         try:
             payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            username: str = payload.get("sub")
-            if username is None:
-                raise credentials_exception
+            if payload.get("sub") is None:
+                raise AuthService._credentials_exception()
         except JWTError:
-            raise credentials_exception
-            
-        user = db.query(User).filter(User.username == username).first()
-        if user is None:
-            raise credentials_exception
-        return user
\ No newline at end of file
+            raise AuthService._credentials_exception()
+        return payload
+
+    @staticmethod
+    async def get_token_version(user_id: int) -> Optional[int]:
+        """The user's current token version, None if it can't be checked right now."""
+        cached = AuthService._token_versions.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        try:
+            version = await redis_client.get_token_version(user_id)
+        except Exception as e:
+            # don't log everyone out over a redis blip, tokens still expire
+            logger.warning(f"Could not check token version of user {user_id}: {e}")
+            return cached[0] if cached is not None else None
+        AuthService._token_versions[user_id] = (version, time.monotonic() + settings.TOKEN_VERSION_CACHE_TTL)
+        return version
+
+    @staticmethod
+    async def revoke_tokens(user_id: int) -> int:
+        version = await redis_client.bump_token_version(user_id)
+        AuthService._token_versions[user_id] = (version, time.monotonic() + settings.TOKEN_VERSION_CACHE_TTL)
+        return version
+
+    @staticmethod
+    async def get_current_user_async(db: AsyncSession, token: str) -> Union[UserSchema, User]:
+        """Resolve a bearer token to its user, rejecting tokens revoked by a logout-all.
+
+        Tokens without ``uid`` predate versioning and count as version 0, so they stop
+        working once the user's version has been bumped. Tokens issued while redis was
+        unreachable also carry version 0 and are rejected once redis reports a higher one.
+        While redis stays unreachable the check is skipped and expiry is the only limit.
+        """
+        payload = AuthService._decode_token(token)
+        if "uid" not in payload:
+            # issued before tokens carried the user, look it up
+            user = await db.scalar(select(User).where(User.username == payload["sub"]))
+            if user is None:
+                raise AuthService._credentials_exception()
+            version = await AuthService.get_token_version(user.id)
+            if version is not None and version != 0:
+                raise AuthService._credentials_exception()
+            return user
+
+        version = await AuthService.get_token_version(payload["uid"])
+        if version is not None and payload.get("ver", 0) != version:
+            raise AuthService._credentials_exception()
+        return UserSchema(id=payload["uid"], username=payload["sub"], created_at=payload["created_at"])
@@ -1,8 +1,12 @@
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+from typing import Optional
 
 from ..models.models import Device, DeviceStatus, Gateway
 from ..schemas.schemas import DeviceCreate
+from ..scheduler.notifier import scheduler_notifier
+from ..scheduler.liveness import liveness_store
+from .pagination import paginate
 
 class DeviceService:
 
@@ -25,11 +29,23 @@ class DeviceService:
         except Exception as e:
             db.rollback()
             raise Exception(str(e))
+        liveness_store.forget(db_device.gateway_id)
         return db_device
 
     @staticmethod
-    def get_devices_service(db: Session, skip: int = 0, limit: int = 100):
-        return db.query(Device).offset(skip).limit(limit).all()
+    def get_devices_service(
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        status: Optional[DeviceStatus] = None,
+        gateway_id: Optional[int] = None,
+    ):
+        query = db.query(Device)
+        if status is not None:
+            query = query.filter(Device.status == status)
+        if gateway_id is not None:
+            query = query.filter(Device.gateway_id == gateway_id)
+        return paginate(query, [Device.id], cursor, limit, descending=False)
 
     @staticmethod
     def get_device_service(device_id: int, db: Session):
@@ -47,6 +63,8 @@ class DeviceService:
         device.last_seen = datetime.now(timezone.utc)
         db.commit()
         db.refresh(device)
+        liveness_store.forget(device.gateway_id)
+        scheduler_notifier.notify("device_state")
         return device
 
     @staticmethod
@@ -54,6 +72,8 @@ class DeviceService:
         device = db.query(Device).filter(Device.id == device_id).first()
         if not device:
             raise Exception("Device not found")
+        gateway_id = device.gateway_id
         db.delete(device)
         db.commit()
+        liveness_store.forget(gateway_id)
         return {"message": "Device deleted"}
\ No newline at end of file
@@ -1,52 +1,175 @@
+import hashlib
 import os
-from fastapi import UploadFile, HTTPException
+import tempfile
+from typing import Optional
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from ..models.models import File
 from ..config import settings
 
+# room for the part headers and boundaries around the file in a multipart body
+MULTIPART_OVERHEAD = 64 * 1024
+
+def _too_large():
+    return HTTPException(status_code=413, detail=f"File larger than {settings.MAX_UPLOAD_SIZE} bytes")
+
+class _UploadWriter:
+    """Multipart parser callbacks writing the `file` field straight to a temp file.
+
+    The bytes are hashed and counted on the way, the upload is refused as
+    soon as it passes MAX_UPLOAD_SIZE. Other fields are skipped. The temp
+    file lives in the upload directory, so `commit` can move it into place
+    in one step and a download never sees a partly written file.
+    """
+
+    def __init__(self, upload_dir: str):
+        self.upload_dir = upload_dir
+        self.filename: Optional[str] = None
+        self.temp_path: Optional[str] = None
+        self.complete = False
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self._buffer = None
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if options.get(b"name") != b"file" or self.temp_path is not None:
+            return
+        # a client-supplied name must not point outside the user's directory
+        self.filename = os.path.basename(options.get(b"filename", b"").decode("utf-8", "replace"))
+        os.makedirs(self.upload_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=self.upload_dir, prefix=".upload-")
+        self._buffer = os.fdopen(fd, "wb")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._buffer is None:
+            return
+        self.size += end - start
+        if self.size > settings.MAX_UPLOAD_SIZE:
+            raise _too_large()
+        chunk = data[start:end]
+        self.digest.update(chunk)
+        self._buffer.write(chunk)
+
+    def on_part_end(self):
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+            self.complete = True
+
+    def commit(self, file_path: str):
+        os.replace(self.temp_path, file_path)
+        self.temp_path = None
+
+    def discard(self):
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+        if self.temp_path is not None:
+            os.unlink(self.temp_path)
+            self.temp_path = None
+
 class FileService:
-    
+
     @staticmethod
-    def save_file(db: Session, file: UploadFile, user_id: int) -> File:
+    async def save_file(db: AsyncSession, request: Request, user_id: int) -> File:
+        """Streams a multipart upload to disk without buffering the body first.
+
+        A declared Content-Length over the limit is refused before anything is
+        read; otherwise the `file` field goes through the parser chunk by
+        chunk as the body arrives.
+        """
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD:
+            raise _too_large()
+        content_type, options = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
         upload_dir = os.path.join(settings.UPLOAD_DIR, str(user_id))
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = file.file.read()
-            buffer.write(content)
-        
+        writer = _UploadWriter(upload_dir)
+        parser = MultipartParser(options[b"boundary"], writer.callbacks())
+        try:
+            # disk writes stay off the event loop
+            async for chunk in request.stream():
+                await run_in_threadpool(parser.write, chunk)
+            await run_in_threadpool(parser.finalize)
+            if not writer.complete:
+                raise HTTPException(status_code=400, detail="Missing file")
+            if not writer.filename:
+                raise HTTPException(status_code=400, detail="Missing filename")
+            file_path = os.path.join(upload_dir, writer.filename)
+            await run_in_threadpool(writer.commit, file_path)
+        except BaseException:
+            await run_in_threadpool(writer.discard)
+            raise
+        size, sha256 = writer.size, writer.digest.hexdigest()
+
         db_file = File(
-            filename=file.filename,
+            filename=writer.filename,
             path=file_path,
-            user_id=user_id
+            user_id=user_id,
+            size=size,
+            sha256=sha256,
         )
         db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        await db.commit()
+        await db.refresh(db_file)
         return db_file
-    
+
     @staticmethod
-    def get_user_files(db: Session, user_id: int) -> list[File]:
-        return db.query(File).filter(File.user_id == user_id).all()
-    
+    async def get_user_files(db: AsyncSession, user_id: int) -> list[File]:
+        return list(await db.scalars(select(File).where(File.user_id == user_id)))
+
     @staticmethod
-    def get_file(db: Session, file_id: int, user_id: int) -> File:
-        file = db.query(File).filter(File.id == file_id, File.user_id == user_id).first()
+    async def get_file(db: AsyncSession, file_id: int, user_id: int) -> File:
+        file = await db.scalar(select(File).where(File.id == file_id, File.user_id == user_id))
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
         return file
-    
+
     @staticmethod
-    def delete_file(db: Session, file_id: int, user_id: int):
-        file = FileService.get_file(db, file_id, user_id)
-        os.remove(file.path)
-        db.delete(file)
-        db.commit()
+    async def delete_file(db: AsyncSession, file_id: int, user_id: int):
+        file = await FileService.get_file(db, file_id, user_id)
+        await run_in_threadpool(os.remove, file.path)
+        await db.delete(file)
+        await db.commit()
 
     @staticmethod
     def get_file_for_gateway(db: Session, file_id: int) -> File:
         file = db.query(File).filter(File.id == file_id).first()
         if not file:
             raise HTTPException(status_code=404, detail="File not found")
-        return file
\ No newline at end of file
+        return file
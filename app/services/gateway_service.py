@@ -1,9 +1,16 @@
 import secrets
 import hashlib
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+from typing import Optional
 from ..models.models import Gateway, DeviceStatus, VerificationStatus
 from ..schemas.schemas import GatewayCreate, GatewayRegister
+from ..scheduler.notifier import scheduler_notifier
+from ..scheduler.liveness import liveness_store
+from .gateway_token_cache import GatewayIdentity, gateway_token_cache
+from .job_service import JobService
 
 class GatewayService:
 
@@ -17,9 +24,30 @@ class GatewayService:
         return hashlib.sha256(token.encode()).hexdigest()
 
     @staticmethod
-    def get_gateway_by_token(token: str, db: Session) -> Gateway:
+    def _cache_gateway(token_hash: str, row) -> Optional[GatewayIdentity]:
+        if row is None:
+            return None
+        gateway = GatewayIdentity(row.id, row.name)
+        gateway_token_cache.put(token_hash, gateway)
+        return gateway
+
+    @staticmethod
+    def get_gateway_by_token(token: str, db: Session) -> Optional[GatewayIdentity]:
         token_hash = GatewayService.hash_token(token)
-        return db.query(Gateway).filter(Gateway.token_hash == token_hash).first()
+        gateway = gateway_token_cache.get(token_hash)
+        if gateway is not None:
+            return gateway
+        row = db.execute(select(Gateway.id, Gateway.name).where(Gateway.token_hash == token_hash)).first()
+        return GatewayService._cache_gateway(token_hash, row)
+
+    @staticmethod
+    async def get_gateway_by_token_async(token: str, db: AsyncSession) -> Optional[GatewayIdentity]:
+        token_hash = GatewayService.hash_token(token)
+        gateway = gateway_token_cache.get(token_hash)
+        if gateway is not None:
+            return gateway
+        row = (await db.execute(select(Gateway.id, Gateway.name).where(Gateway.token_hash == token_hash))).first()
+        return GatewayService._cache_gateway(token_hash, row)
 
     @staticmethod
     def verify_gateway_service(verify: GatewayRegister, db: Session):
@@ -64,20 +92,37 @@ class GatewayService:
 
     @staticmethod
     def gateway_heartbeat_service(gateway_id: int, active_device_ids: list[int], db: Session):
+        now = datetime.now(timezone.utc)
+        active_device_ids = frozenset(active_device_ids)
+        # nothing to change in the database, the liveness store writes last_seen later
+        if liveness_store.is_synced(gateway_id, active_device_ids):
+            liveness_store.record(gateway_id, active_device_ids, now)
+            return {"message": "Gateway and devices heartbeat updated"}
+
         gateway = db.query(Gateway).filter(Gateway.id == gateway_id).first()
         if not gateway:
             raise Exception("Gateway not found")
-        gateway.last_seen = datetime.now(timezone.utc)
+        gateway.last_seen = now
+        state_changed = False
         if gateway.status == DeviceStatus.offline:
             gateway.status = DeviceStatus.available
+            state_changed = True
 
         devices = gateway.devices
+        lost_device_ids = []
         for device in devices:
             if device.id in active_device_ids:
-                device.last_seen = datetime.now(timezone.utc)
+                device.last_seen = now
                 if device.status == DeviceStatus.offline:
                     device.status = DeviceStatus.available
-            else:
+                    state_changed = True
+            elif device.status != DeviceStatus.offline:
                 device.status = DeviceStatus.offline
+                lost_device_ids.append(device.id)
+                state_changed = True
         db.commit()
-        return {"message": "Gateway and devices heartbeat updated"}
\ No newline at end of file
+        liveness_store.mark_synced(gateway_id, active_device_ids, now)
+        JobService.fail_device_jobs_service(lost_device_ids, db)
+        if state_changed:
+            scheduler_notifier.notify("gateway_state")
+        return {"message": "Gateway and devices heartbeat updated"}
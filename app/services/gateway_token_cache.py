@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from sqlalchemy import event
+
+from ..config import settings
+from ..models.models import Gateway
+
+class GatewayIdentity(NamedTuple):
+    id: int
+    name: str
+
+class GatewayTokenCache:
+    """Bounded LRU of token hash -> gateway, so gateway requests skip the lookup query.
+
+    Deleting a gateway or changing its token through the ORM drops the old
+    hash here. Entries expire after GATEWAY_TOKEN_CACHE_TTL seconds, which
+    bounds how long other API instances keep such a token. Unknown
+    tokens are not cached, a new gateway is usable right away. Shared by the
+    sync handlers in the threadpool and the async ones, hence the lock.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[GatewayIdentity, float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token_hash: str) -> Optional[GatewayIdentity]:
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[token_hash]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token_hash)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, token_hash: str, gateway: GatewayIdentity):
+        if settings.GATEWAY_TOKEN_CACHE_SIZE <= 0:
+            return
+        with self._lock:
+            self._entries[token_hash] = (gateway, time.monotonic() + settings.GATEWAY_TOKEN_CACHE_TTL)
+            self._entries.move_to_end(token_hash)
+            while len(self._entries) > settings.GATEWAY_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token_hash: str):
+        with self._lock:
+            self._entries.pop(token_hash, None)
+
+    def get_stats(self):
+        return {
+            "size": len(self._entries),
+            "max_size": settings.GATEWAY_TOKEN_CACHE_SIZE,
+            "ttl": settings.GATEWAY_TOKEN_CACHE_TTL,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+gateway_token_cache = GatewayTokenCache()
+
+# bulk delete()/update() statements skip these, go through the ORM to revoke a token
+@event.listens_for(Gateway.token_hash, "set", active_history=True)
+def _token_hash_changed(target, value, oldvalue, initiator):
+    if isinstance(oldvalue, str) and oldvalue != value:
+        gateway_token_cache.invalidate(oldvalue)
+
+@event.listens_for(Gateway, "after_delete")
+def _gateway_deleted(mapper, connection, target):
+    gateway_token_cache.invalidate(target.token_hash)
@@ -1,105 +1,197 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from datetime import datetime, timezone
+from collections import defaultdict
+from typing import List, Optional
 from fastapi import BackgroundTasks
+import logging
 
-from ..models.models import JobGroup, Job, Device, JobStatus, DeviceStatus
+from ..models.models import ArchivedJob, ArchivedJobGroup, JobGroup, Job, Device, File, JobStatus, DeviceStatus
 from ..schemas.schemas import JobGroupCreate
 from ..queue.redis_client import redis_client
+from ..queue.job_events import job_events
+from .pagination import as_utc, paginate_merged
+
+logger = logging.getLogger(__name__)
 
 class JobGroupService:
 
     @staticmethod
     def create_job_group_service(job_group: JobGroupCreate, user_id: int, db: Session, background_tasks: BackgroundTasks):
-        if not job_group.jobs or len(job_group.jobs) == 0:
+        return JobGroupService.create_job_groups_service([job_group], user_id, db, background_tasks)[0]
+
+    @staticmethod
+    def create_job_groups_service(job_groups: List[JobGroupCreate], user_id: int, db: Session, background_tasks: BackgroundTasks):
+        if any(not job_group.jobs for job_group in job_groups):
             raise Exception("No jobs provided")
+        # a group holds each of its devices once, two jobs can't share one
+        for job_group in job_groups:
+            group_device_ids = [job.device_id for job in job_group.jobs]
+            if len(set(group_device_ids)) != len(group_device_ids):
+                raise Exception("Duplicate device in job group")
 
-        device_ids = [job.device_id for job in job_group.jobs]
-        devices = db.query(Device).filter(Device.id.in_(device_ids)).all()
-        if len(devices) != len(device_ids):
-            raise Exception("One or more devices not found")
-        
-        device_map = {device.id: device for device in devices}
-        
-        db_job_group = JobGroup(
-            name=job_group.name,
-            user_id=user_id,
-            status=JobStatus.preparing,
-            created_at=datetime.now(timezone.utc)
+        # validate every referenced device and file with one query each
+        device_ids = {job.device_id for job_group in job_groups for job in job_group.jobs}
+        gateway_of_device = dict(
+            db.execute(select(Device.id, Device.gateway_id).where(Device.id.in_(device_ids))).all()
         )
-        db.add(db_job_group)
-        db.flush()
-
-        for job_data in job_group.jobs:
-            job = Job(
-                group_id=db_job_group.id,
-                device_id=job_data.device_id,
-                source_file_id=job_data.source_file_id,
-                status=JobStatus.preparing,
-                created_at=datetime.now(timezone.utc)
-            )
-            db.add(job)
-        
+        if len(gateway_of_device) != len(device_ids):
+            raise Exception("One or more devices not found")
+        file_ids = {job.source_file_id for job_group in job_groups for job in job_group.jobs}
+        found_files = db.scalars(select(File.id).where(File.id.in_(file_ids), File.user_id == user_id)).all()
+        if len(found_files) != len(file_ids):
+            raise Exception("One or more source files not found")
+
+        now = datetime.now(timezone.utc)
         try:
+            # the jobs need their group's id, so the group ids must come back in input order;
+            # postgres batches that, sqlite falls back to a statement per group
+            group_ids = db.scalars(
+                insert(JobGroup).returning(JobGroup.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "name": job_group.name,
+                        "user_id": user_id,
+                        "status": JobStatus.preparing,
+                        "created_at": now,
+                        "jobs_total": len(job_group.jobs),
+                        "jobs_preparing": len(job_group.jobs),
+                    }
+                    for job_group in job_groups
+                ],
+            ).all()
+            # the notifications don't care about order, so the jobs are batched everywhere
+            jobs = db.execute(
+                insert(Job).returning(Job.id, Job.device_id, Job.source_file_id),
+                [
+                    {
+                        "group_id": group_id,
+                        "device_id": job.device_id,
+                        "source_file_id": job.source_file_id,
+                        "status": JobStatus.preparing,
+                        "created_at": now,
+                    }
+                    for group_id, job_group in zip(group_ids, job_groups)
+                    for job in job_group.jobs
+                ],
+            ).all()
             db.commit()
-            db.refresh(db_job_group)
         except Exception as e:
             db.rollback()
             raise Exception(str(e))
-        
-        for job in db_job_group.jobs:
-            device = device_map[job.device_id]
-            gateway_id = device.gateway_id
-            notification = {
-                "job_id": job.id,
-                "source_file_id": job.source_file_id
-            }
-            background_tasks.add_task(redis_client.push_download_notification, gateway_id, notification)
-        
-        return db_job_group
+
+        notifications = defaultdict(list)
+        for job_id, device_id, source_file_id in jobs:
+            notifications[gateway_of_device[device_id]].append({
+                "job_id": job_id,
+                "source_file_id": source_file_id
+            })
+        background_tasks.add_task(redis_client.push_download_notifications, dict(notifications))
+
+        created = (
+            db.query(JobGroup)
+            .options(selectinload(JobGroup.jobs))
+            .filter(JobGroup.id.in_(group_ids))
+            .all()
+        )
+        order = {group_id: position for position, group_id in enumerate(group_ids)}
+        return sorted(created, key=lambda group: order[group.id])
 
     @staticmethod
-    def get_queue_status_service(user_id: int, db: Session):
-        pending_groups = db.query(JobGroup).filter(
-            JobGroup.status == JobStatus.pending,
-            JobGroup.user_id == user_id
-        ).all()
-        
+    async def get_queue_status_service(user_id: int, db: AsyncSession):
+        pending_groups = (await db.scalars(
+            select(JobGroup)
+            .where(JobGroup.status == JobStatus.pending, JobGroup.user_id == user_id)
+            .order_by(JobGroup.created_at, JobGroup.id)
+        )).all()
+
+        # devices of all the user's pending groups in one query
+        group_devices = defaultdict(dict)
+        rows = (await db.execute(
+            select(Job.group_id, Device.id, Device.name, Device.status)
+            .join(Device, Device.id == Job.device_id)
+            .where(Job.group_id.in_([group.id for group in pending_groups]))
+        )).all()
+        for group_id, device_id, name, status in rows:
+            group_devices[group_id][device_id] = {
+                "device_id": device_id,
+                "name": name,
+                "status": status.value
+            }
+
+        # positions and start estimates are published by the scheduler owning shard 0
+        try:
+            estimates = await redis_client.get_queue_estimates([group.id for group in pending_groups])
+        except Exception as e:
+            logger.warning(f"Could not read queue estimates: {e}")
+            estimates = {}
         queue_status = []
         for group in pending_groups:
-            jobs = db.query(Job).filter(Job.group_id == group.id).all()
-            device_ids = [job.device_id for job in jobs]
-            devices = db.query(Device).filter(Device.id.in_(device_ids)).all()
-            
+            devices = list(group_devices[group.id].values())
+            estimate = estimates.get(group.id, {})
             queue_status.append({
                 "group_id": group.id,
                 "name": group.name,
                 "created_at": group.created_at,
-                "devices": [
-                    {
-                        "device_id": device.id,
-                        "name": device.name,
-                        "status": device.status.value
-                    }
-                    for device in devices
-                ],
-                "ready_to_run": all(device.status == DeviceStatus.available for device in devices)
+                "devices": devices,
+                "ready_to_run": all(device["status"] == DeviceStatus.available.value for device in devices),
+                "queue_position": estimate.get("queue_position"),
+                "estimated_start": estimate.get("estimated_start")
             })
         return queue_status
 
     @staticmethod
-    def get_job_groups_service(user_id: int, db: Session, skip: int = 0, limit: int = 100):
-        return db.query(JobGroup).filter(JobGroup.user_id == user_id).offset(skip).limit(limit).all()
+    def get_job_groups_service(
+        user_id: int,
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        status: Optional[JobStatus] = None,
+        device_id: Optional[int] = None,
+        gateway_id: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ):
+        sources = []
+        # model is JobGroup or ArchivedJobGroup, which share their column names
+        for model, job_model in ((JobGroup, Job), (ArchivedJobGroup, ArchivedJob)):
+            # the jobs of the whole page are loaded in one query
+            query = db.query(model).options(selectinload(model.jobs)).filter(model.user_id == user_id)
+            if status is not None:
+                query = query.filter(model.status == status)
+            if device_id is not None:
+                query = query.filter(model.jobs.any(job_model.device_id == device_id))
+            if gateway_id is not None:
+                query = query.filter(model.jobs.any(
+                    job_model.device_id.in_(select(Device.id).where(Device.gateway_id == gateway_id))
+                ))
+            if created_after is not None:
+                query = query.filter(model.created_at >= as_utc(created_after))
+            if created_before is not None:
+                query = query.filter(model.created_at < as_utc(created_before))
+            sources.append((query, [model.created_at, model.id]))
+        return paginate_merged(sources, cursor, limit)
 
     @staticmethod
-    def get_job_group_service(group_id: int, user_id: int, db: Session):
+    def _get_owned_group(group_id: int, user_id: int, db: Session):
         job_group = db.query(JobGroup).filter(
             JobGroup.id == group_id,
             JobGroup.user_id == user_id
         ).first()
+        if not job_group:
+            job_group = db.query(ArchivedJobGroup).filter(
+                ArchivedJobGroup.id == group_id,
+                ArchivedJobGroup.user_id == user_id
+            ).first()
         if not job_group:
             raise Exception("Job group not found")
         return job_group
 
+    @staticmethod
+    def get_job_group_service(group_id: int, user_id: int, db: Session):
+        return JobGroupService._get_owned_group(group_id, user_id, db)
+
     @staticmethod
     def cancel_job_group_service(group_id: int, user_id: int, db: Session):
         job_group = db.query(JobGroup).filter(
@@ -119,35 +211,29 @@ class JobGroupService:
             Job.group_id == group_id,
             Job.status.in_([JobStatus.pending, JobStatus.running])
         ).update({"status": JobStatus.cancelled, "completed_at": datetime.now(timezone.utc)})
+        job_group.jobs_cancelled = JobGroup.jobs_cancelled + JobGroup.jobs_pending + JobGroup.jobs_running
+        job_group.jobs_pending = 0
+        job_group.jobs_running = 0
         
         db.commit()
+        job_events.publish("group", user_id, group_id, JobStatus.cancelled)
         return {"message": "Job group cancelled"}
 
     @staticmethod
     def get_job_group_status_service(group_id: int, user_id: int, db: Session):
-        job_group = db.query(JobGroup).filter(
-            JobGroup.id == group_id,
-            JobGroup.user_id == user_id
-        ).first()
-        if not job_group:
-            raise Exception("Job group not found")
+        job_group = JobGroupService._get_owned_group(group_id, user_id, db)
+        job_model = ArchivedJob if isinstance(job_group, ArchivedJobGroup) else Job
         
-        jobs = db.query(Job).filter(Job.group_id == group_id).all()
-        status_counts = {
-            "total": len(jobs),
-            "pending": sum(1 for job in jobs if job.status == JobStatus.pending),
-            "running": sum(1 for job in jobs if job.status == JobStatus.running),
-            "completed": sum(1 for job in jobs if job.status == JobStatus.completed),
-            "cancelled": sum(1 for job in jobs if job.status == JobStatus.cancelled),
-            "failed": sum(1 for job in jobs if job.status == JobStatus.failed)
-        }
-        
-        device_ids = [job.device_id for job in jobs]
-        devices = db.query(Device).filter(Device.id.in_(device_ids)).all()
+        devices = (
+            db.query(Device.id, Device.name, Device.status)
+            .join(job_model, job_model.device_id == Device.id)
+            .filter(job_model.group_id == group_id)
+            .all()
+        )
         
         return {
             "group_status": job_group.status.value,
-            "job_stats": status_counts,
+            "job_stats": job_group.job_stats(),
             "created_at": job_group.created_at,
             "started_at": job_group.started_at,
             "completed_at": job_group.completed_at,
@@ -1,63 +1,261 @@
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
+from collections import defaultdict
+from typing import List, Optional
 
-from ..models.models import Job, JobGroup, Device, JobStatus, DeviceStatus
-from ..schemas.schemas import JobStatusUpdate
+from ..models.models import ArchivedJob, Job, JobGroup, Device, JobStatus, DeviceStatus
+from ..schemas.schemas import JobStatusBatchItem, JobStatusUpdate
+from ..scheduler.notifier import scheduler_notifier
+from ..queue.job_events import job_events
+from .pagination import as_utc, paginate_merged
+
+FINISHED_STATUSES = [JobStatus.completed, JobStatus.failed, JobStatus.cancelled]
+IN_FLIGHT_STATUSES = [JobStatus.preparing, JobStatus.running]
 
 class JobService:
 
     @staticmethod
-    def get_jobs_service(db: Session, skip: int = 0, limit: int = 100):
-        return db.query(Job).offset(skip).limit(limit).all()
+    def _filter_jobs(query, model, status, group_id, device_id, gateway_id, created_after, created_before):
+        # model is Job or ArchivedJob, which share their column names
+        if status is not None:
+            query = query.filter(model.status == status)
+        if group_id is not None:
+            query = query.filter(model.group_id == group_id)
+        if device_id is not None:
+            query = query.filter(model.device_id == device_id)
+        if gateway_id is not None:
+            query = query.filter(model.device_id.in_(select(Device.id).where(Device.gateway_id == gateway_id)))
+        if created_after is not None:
+            query = query.filter(model.created_at >= as_utc(created_after))
+        if created_before is not None:
+            query = query.filter(model.created_at < as_utc(created_before))
+        return query
+
+    @staticmethod
+    def get_jobs_service(
+        db: Session,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        status: Optional[JobStatus] = None,
+        group_id: Optional[int] = None,
+        device_id: Optional[int] = None,
+        gateway_id: Optional[int] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ):
+        filters = (status, group_id, device_id, gateway_id, created_after, created_before)
+        return paginate_merged(
+            [
+                (JobService._filter_jobs(db.query(model), model, *filters), [model.created_at, model.id])
+                for model in (Job, ArchivedJob)
+            ],
+            cursor,
+            limit,
+        )
 
     @staticmethod
     def get_job_service(job_id: int, db: Session):
         job = db.query(Job).filter(Job.id == job_id).first()
+        if not job:
+            # finished jobs of old groups live in the archive
+            job = db.query(ArchivedJob).filter(ArchivedJob.id == job_id).first()
         if not job:
             raise Exception("Job not found")
         return job
 
     @staticmethod
     def update_job_status_service(job_id: int, status_update: JobStatusUpdate, db: Session):
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise Exception("Job not found")
-        
-        job.status = status_update.status
-        if status_update.output_file_id is not None:
-            job.output_file_id = status_update.output_file_id
-        
-        if status_update.status in [JobStatus.completed, JobStatus.failed]:
-            job.completed_at = datetime.now(timezone.utc)
-            
-            device = db.query(Device).filter(Device.id == job.device_id).first()
-            if device:
-                device.status = DeviceStatus.available
-                device.last_seen = datetime.now(timezone.utc)
-                
-        group = db.query(JobGroup).filter(JobGroup.id == job.group_id).first()
-        if group:
-            all_jobs = db.query(Job).filter(Job.group_id == group.id).all()
-
-            if all(j.status == JobStatus.pending for j in all_jobs):
-                group.status = JobStatus.pending
-            
-            if any(j.status == JobStatus.cancelled for j in all_jobs):
-                group.status = JobStatus.cancelled
-                for j in all_jobs:
-                    j.status = JobStatus.cancelled
-                    j.completed_at = datetime.now(timezone.utc)
-            
-            if all(j.status in [JobStatus.completed, JobStatus.failed] for j in all_jobs):
-                group.completed_at = datetime.now(timezone.utc)
-                group.status = JobStatus.completed
-                if any(j.status == JobStatus.failed for j in all_jobs):
-                    group.status = JobStatus.failed
-            
+        result = JobService.update_job_statuses_service(
+            [JobStatusBatchItem(job_id=job_id, **status_update.model_dump())], db
+        )[0]
+        if not result["ok"]:
+            raise Exception(result["detail"])
+        return {"message": "Job status updated successfully"}
+
+    @staticmethod
+    def _reevaluate_group(group: JobGroup, db: Session, now: datetime, reached_pending: bool = False):
+        # group state follows from its counters, no need to load its jobs
+        if group.jobs_failed and group.status in [JobStatus.preparing, JobStatus.pending]:
+            # a group only runs whole, a job failing before dispatch fails it
+            db.execute(
+                update(Job)
+                .where(Job.group_id == group.id, Job.status.in_([JobStatus.preparing, JobStatus.pending]))
+                .values(status=JobStatus.cancelled, completed_at=now)
+            )
+            group.jobs_cancelled += group.jobs_preparing + group.jobs_pending
+            group.jobs_preparing = 0
+            group.jobs_pending = 0
+            group.status = JobStatus.failed
+            group.completed_at = now
+            return
+
+        if reached_pending or group.jobs_pending == group.jobs_total:
+            group.status = JobStatus.pending
+
+        if group.jobs_cancelled:
+            group.status = JobStatus.cancelled
+            db.execute(
+                update(Job)
+                .where(Job.group_id == group.id)
+                .values(status=JobStatus.cancelled, completed_at=now)
+            )
+            for status in JobStatus:
+                setattr(group, f"jobs_{status.value}", 0)
+            group.jobs_cancelled = group.jobs_total
+
+        if group.jobs_completed + group.jobs_failed == group.jobs_total:
+            group.completed_at = now
+            group.status = JobStatus.completed
+            if group.jobs_failed:
+                group.status = JobStatus.failed
+
+    @staticmethod
+    def update_job_statuses_service(updates: List[JobStatusBatchItem], db: Session,
+                                    gateway_id: Optional[int] = None):
+        """Applies job status transitions in order, in one transaction.
+
+        Each transition is checked against the job's status as of the
+        previous one, so a stale or conflicting update is rejected on its own
+        without failing the rest of the batch. Counters move once per group
+        and every touched group is re-evaluated once, remembering whether all
+        of its jobs were pending at some point during the batch. With a
+        gateway_id, only jobs on that gateway's devices may be updated.
+        """
+        now = datetime.now(timezone.utc)
+        jobs = {job.id: job for job in db.query(Job).filter(Job.id.in_({item.job_id for item in updates}))}
+        if gateway_id is not None:
+            gateway_devices = set(db.scalars(select(Device.id).where(Device.gateway_id == gateway_id)))
+        current_status = {job_id: job.status for job_id, job in jobs.items()}
+        # counters as they move through the batch, to catch a group passing through all pending
+        counters = {
+            group.id: group.job_stats()
+            for group in db.query(JobGroup).filter(JobGroup.id.in_({job.group_id for job in jobs.values()}))
+        }
+        reached_pending = set()
+        counter_deltas = defaultdict(lambda: defaultdict(int))
+        freed_devices = set()
+        applied = []
+        results = []
+
+        for item in updates:
+            job = jobs.get(item.job_id)
+            if job is None:
+                results.append({"job_id": item.job_id, "ok": False, "detail": "Job not found"})
+                continue
+            if gateway_id is not None and job.device_id not in gateway_devices:
+                results.append({"job_id": item.job_id, "ok": False, "detail": "Job not associated with this gateway"})
+                continue
+
+            previous_status = current_status[job.id]
+            # e.g. a gateway working through a stale queue after it was taken offline
+            if previous_status in FINISHED_STATUSES and item.status != previous_status:
+                # cancelling leaves a started job's device busy until the gateway is done with it
+                if (
+                    previous_status == JobStatus.cancelled
+                    and job.started_at is not None
+                    and item.status in [JobStatus.completed, JobStatus.failed]
+                ):
+                    freed_devices.add(job.device_id)
+                results.append({"job_id": item.job_id, "ok": False, "detail": "Job already finished"})
+                continue
+            values = {"status": item.status}
+            if item.output_file_id is not None:
+                values["output_file_id"] = item.output_file_id
+            if item.status in [JobStatus.completed, JobStatus.failed]:
+                values["completed_at"] = now
+
+            # only move the counters if this update is the one that changed the status
+            updated = db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == previous_status)
+                .values(**values)
+            ).rowcount
+            if updated != 1:
+                results.append({"job_id": item.job_id, "ok": False, "detail": "Job status changed concurrently, retry"})
+                continue
+
+            current_status[job.id] = item.status
+            # only a running job holds its device, a job failing while preparing never had it
+            if previous_status == JobStatus.running and item.status in [JobStatus.completed, JobStatus.failed]:
+                freed_devices.add(job.device_id)
+            if previous_status != item.status:
+                counter_deltas[job.group_id][previous_status] -= 1
+                counter_deltas[job.group_id][item.status] += 1
+                group_counters = counters.get(job.group_id)
+                if group_counters is not None:
+                    group_counters[previous_status.value] -= 1
+                    group_counters[item.status.value] += 1
+                    if group_counters["pending"] == group_counters["total"]:
+                        reached_pending.add(job.group_id)
+            applied.append((job.id, job.group_id, item.status))
+            results.append({"job_id": item.job_id, "ok": True, "detail": None})
+
+        if freed_devices:
+            # a device the heartbeats took offline stays offline until it reports in again
+            db.execute(
+                update(Device)
+                .where(Device.id.in_(freed_devices), Device.status != DeviceStatus.offline)
+                .values(status=DeviceStatus.available, last_seen=now)
+            )
+        for group_id, deltas in counter_deltas.items():
+            deltas = {status: delta for status, delta in deltas.items() if delta}
+            if deltas:
+                db.execute(
+                    update(JobGroup)
+                    .where(JobGroup.id == group_id)
+                    .values({
+                        JobGroup.job_counter(status): JobGroup.job_counter(status) + delta
+                        for status, delta in deltas.items()
+                    })
+                )
+
+        groups = (
+            db.query(JobGroup)
+            .filter(JobGroup.id.in_({group_id for _, group_id, _ in applied}))
+            .populate_existing()
+            .all()
+        )
+        group_transitions = {}
+        for group in groups:
+            previous_group_status = group.status
+            JobService._reevaluate_group(group, db, now, group.id in reached_pending)
+            group_transitions[group.id] = (group.user_id, previous_group_status, group.status)
+
         try:
             db.commit()
         except Exception as e:
             db.rollback()
             raise Exception(str(e))
-        
-        return {"message": "Job status updated successfully"}
\ No newline at end of file
+
+        for job_id, group_id, status in applied:
+            if group_id in group_transitions:
+                job_events.publish("job", group_transitions[group_id][0], group_id, status, job_id=job_id)
+        for group_id, (user_id, previous_group_status, group_status) in group_transitions.items():
+            if group_status != previous_group_status:
+                job_events.publish("group", user_id, group_id, group_status)
+
+        # a freed device or a newly pending group may let the scheduler dispatch
+        if freed_devices:
+            scheduler_notifier.notify("job_finished")
+        elif any(
+            group_status == JobStatus.pending and previous_group_status != JobStatus.pending
+            for _, previous_group_status, group_status in group_transitions.values()
+        ):
+            scheduler_notifier.notify("group_pending")
+
+        return results
+
+    @staticmethod
+    def fail_device_jobs_service(device_ids: List[int], db: Session):
+        """Fails the jobs a gateway was working on when their devices went offline."""
+        if not device_ids:
+            return []
+        job_ids = db.scalars(
+            select(Job.id).where(Job.device_id.in_(device_ids), Job.status.in_(IN_FLIGHT_STATUSES))
+        ).all()
+        if not job_ids:
+            return []
+        return JobService.update_job_statuses_service(
+            [JobStatusBatchItem(job_id=job_id, status=JobStatus.failed) for job_id in job_ids], db
+        )
@@ -0,0 +1,63 @@
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, tuple_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, keys: Sequence[Any]) -> List[Any]:
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(raw, list) or len(raw) != len(keys):
+            raise ValueError
+        return [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime) else int(value)
+            for key, value in zip(keys, raw)
+        ]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # timestamps are stored as naive utc
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def paginate(query: Query, keys: Sequence[Any], cursor: Optional[str], limit: int,
+             descending: bool = True) -> Tuple[list, Optional[str]]:
+    """Keyset pagination over `keys`, which must end in a unique column.
+
+    The page starts right after the row the cursor was taken from, so it is
+    an index range scan however deep the client has paged, and rows inserted
+    meanwhile don't shift later pages. Returns the rows and the cursor for the
+    next page, or None on the last page.
+    """
+    return paginate_merged([(query, keys)], cursor, limit, descending)
+
+def paginate_merged(sources: Sequence[Tuple[Query, Sequence[Any]]], cursor: Optional[str], limit: int,
+                    descending: bool = True) -> Tuple[list, Optional[str]]:
+    """Like `paginate`, over several queries whose keys have the same names and
+    don't overlap, e.g. a hot table and its archive. Each source is seeked
+    separately and the pages are merged."""
+    rows = []
+    for query, keys in sources:
+        if cursor:
+            boundary = tuple_(*decode_cursor(cursor, keys))
+            query = query.filter(tuple_(*keys) < boundary if descending else tuple_(*keys) > boundary)
+        query = query.order_by(*(key.desc() if descending else key.asc() for key in keys))
+        rows += query.limit(limit + 1).all()
+    names = [key.key for key in sources[0][1]]
+    if len(sources) > 1:
+        rows.sort(key=lambda row: [getattr(row, name) for name in names], reverse=descending)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor([getattr(rows[-1], name) for name in names])
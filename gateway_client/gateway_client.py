@@ -1,9 +1,11 @@
 import asyncio
 import os
+import socket
 import aiohttp
 import time
 import subprocess
-from redis_client import redis_client
+from collections import defaultdict, deque
+from redis_client import redis_client, QUEUE_TRANSPORT
 from gateway_add_device import get_device_port
 import serial_asyncio
 from datetime import datetime
@@ -14,6 +16,13 @@ GATEWAY_TOKEN = "abcdefgh12345678"
 SERVER_URL = "http://192.168.43.56:8000"
 DOWNLOAD_DIR = "./downloads"
 MAX_CONCURRENT_JOBS = 4
+# stream transport: stable consumer name so a restarted gateway gets its unacked entries back
+CONSUMER_NAME = f"gateway-{GATEWAY_ID}-{socket.gethostname()}"
+STREAM_CLAIM_IDLE_MS = 15 * 60 * 1000  # reclaim entries another consumer held this long
+STREAM_KEEPALIVE_INTERVAL = 60  # seconds between re-claims of the entries this gateway holds
+DISPATCH_BURST = 100  # messages drained per queue per wake-up
+STATUS_FLUSH_INTERVAL = 0.05  # seconds status updates are held back to share one request
+STATUS_BATCH_SIZE = 100  # status updates sent per request
 
 # Semaphore for concurrent job processing
 job_semaphore = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
@@ -25,41 +34,130 @@ def print_status(job_id=None, device_id=None, message=""):
     device_info = f"[Device {device_id}]" if device_id else ""
     print(f"{timestamp} {job_info}{device_info} {message}")
 
-async def poll_for_download_notifications():
-    await redis_client.init()
-    print_status(message="🚦 Started polling for download notifications")
+async def run_and_ack(queue: str, entry_id: str, work):
+    """Ack a stream entry once its handler has finished, successfully or not"""
+    try:
+        await work
+    finally:
+        try:
+            await redis_client.ack(GATEWAY_ID, queue, entry_id)
+        except Exception as e:
+            print_status(message=f"🔴 Failed to ack {queue} entry {entry_id}: {str(e)}")
+
+async def handle_download_notification(notification: dict):
+    await process_job(notification['job_id'], notification['source_file_id'])
+
+def queue_handlers():
+    return {
+        redis_client.DOWNLOADS_QUEUE: handle_download_notification,
+        redis_client.JOBS_QUEUE: handle_job_notification,
+    }
+
+def log_received(queue: str, data: dict):
+    if queue == redis_client.DOWNLOADS_QUEUE:
+        print_status(job_id=data.get('job_id'), message=f"📥 Received download notification: {data}")
+    else:
+        print_status(job_id=data.get('job_id'), device_id=data.get('device_id'), message="📨 Received job notification")
+
+async def dispatch_lists():
+    """Block on every queue with one BRPOP and hand each drained message to its handler"""
+    handlers = queue_handlers()
     while True:
         try:
-            notification = await redis_client.get_download_notification(GATEWAY_ID)
-            if notification:
-                print_status(
-                    job_id=notification.get('job_id'),
-                    message=f"📥 Received download notification: {notification}"
-                )
-                asyncio.create_task(process_job(
-                    notification['job_id'],
-                    notification['source_file_id']
-                ))
+            messages = await redis_client.wait_for_messages(
+                GATEWAY_ID, list(handlers), burst=DISPATCH_BURST
+            )
+            for queue, data in messages:
+                log_received(queue, data)
+                asyncio.create_task(handlers[queue](data))
         except Exception as e:
-            print_status(message=f"🔴 Download notification error: {str(e)}")
-        await asyncio.sleep(0.1)
+            print_status(message=f"🔴 Notification dispatch error: {str(e)}")
+            await asyncio.sleep(1)
 
-async def poll_for_job_notifications():
-    await redis_client.init()
-    print_status(message="🚦 Started polling for job notifications")
+async def dispatch_streams():
+    """Consume every queue's stream with one XREADGROUP, recovering entries left unacked by a crash
+
+    At most MAX_CONCURRENT_JOBS entries are taken at a time, so the rest wait
+    in the stream rather than unacked in this process, and the ones held here
+    are re-claimed every STREAM_KEEPALIVE_INTERVAL so no consumer takes them
+    over while they run.
+    """
+    handlers = queue_handlers()
+    queues = list(handlers)
+    for queue in queues:
+        await redis_client.ensure_consumer_group(GATEWAY_ID, queue)
+    in_flight = {}  # (queue, entry_id) -> handler task
+    slot_freed = asyncio.Event()
+    # our own entries from before a restart, started as slots free up
+    backlog = deque(await redis_client.read_streams(GATEWAY_ID, queues, CONSUMER_NAME, count=1000, pending=True))
+    if backlog:
+        print_status(message=f"♻️ Recovered {len(backlog)} unacked entries")
+
+    def start(queue: str, entry_id: str, data: dict):
+        key = (queue, entry_id)
+        if key in in_flight:
+            return
+        log_received(queue, data)
+        task = asyncio.create_task(run_and_ack(queue, entry_id, handlers[queue](data)))
+        in_flight[key] = task
+
+        def finished(_):
+            in_flight.pop(key, None)
+            slot_freed.set()
+        task.add_done_callback(finished)
+
+    last_maintenance = 0.0
     while True:
         try:
-            job_data = await redis_client.get_job(GATEWAY_ID)
-            if job_data:
-                print_status(
-                    job_id=job_data.get('job_id'),
-                    device_id=job_data.get('device_id'),
-                    message="📨 Received job notification"
-                )
-                asyncio.create_task(handle_job_notification(job_data))
+            if time.time() - last_maintenance > STREAM_KEEPALIVE_INTERVAL:
+                held = defaultdict(list)
+                for queue, entry_id in list(in_flight):
+                    held[queue].append(entry_id)
+                for queue, entry_id, _ in backlog:
+                    held[queue].append(entry_id)
+                for queue, entry_ids in held.items():
+                    await redis_client.keep_alive(GATEWAY_ID, queue, CONSUMER_NAME, entry_ids)
+                free = MAX_CONCURRENT_JOBS - len(in_flight) - len(backlog)
+                for queue in queues:
+                    if free <= 0:
+                        break
+                    claimed = await redis_client.claim_stale(
+                        GATEWAY_ID, queue, CONSUMER_NAME, STREAM_CLAIM_IDLE_MS, count=free
+                    )
+                    backlog.extend((queue, entry_id, data) for entry_id, data in claimed)
+                    free -= len(claimed)
+                last_maintenance = time.time()
+
+            while backlog and len(in_flight) < MAX_CONCURRENT_JOBS:
+                start(*backlog.popleft())
+
+            free = MAX_CONCURRENT_JOBS - len(in_flight)
+            if free <= 0 or backlog:
+                slot_freed.clear()
+                try:
+                    await asyncio.wait_for(slot_freed.wait(), STREAM_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # COUNT applies per stream, so share the free slots between the queues;
+            # the odd extra entry waits in the backlog, kept alive with the rest
+            backlog.extend(await redis_client.read_streams(
+                GATEWAY_ID, queues, CONSUMER_NAME, count=max(1, free // len(queues))
+            ))
+            while backlog and len(in_flight) < MAX_CONCURRENT_JOBS:
+                start(*backlog.popleft())
         except Exception as e:
-            print_status(message=f"🔴 Job notification error: {str(e)}")
-        await asyncio.sleep(0.1)
+            print_status(message=f"🔴 Stream dispatch error: {str(e)}")
+            await asyncio.sleep(1)
+
+async def dispatch_notifications():
+    await redis_client.init()
+    print_status(message="🚦 Started waiting for download and job notifications")
+    if QUEUE_TRANSPORT == "stream":
+        await dispatch_streams()
+    else:
+        await dispatch_lists()
 
 async def handle_job_notification(job_data: dict):
     async with job_semaphore:
@@ -267,17 +365,80 @@ async def collect_logs(job_id: int, device_id: int):
         except Exception:
             pass
 
-async def update_job_status(job_id: int, new_status: str):
-    try:
-        print_status(job_id, message=f"🔄 Updating status to '{new_status}'")
-        update_url = f"{SERVER_URL}/api/v1/jobs/{job_id}/status"
-        payload = {"status": new_status}
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.put(update_url, json=payload) as response:
+class StatusBatcher:
+    """Coalesces job status updates into PUT /jobs/status requests.
+
+    Updates arriving within STATUS_FLUSH_INTERVAL of each other go out in one
+    request, in the order they were made. Each caller still waits for its own
+    update and gets an exception if it was rejected.
+    """
+
+    def __init__(self, flush_interval: float = STATUS_FLUSH_INTERVAL, batch_size: int = STATUS_BATCH_SIZE):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.pending = []
+        self.session = None
+        self._flush_task = None
+        self._send_lock = asyncio.Lock()
+
+    async def update(self, job_id: int, status: str):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(({"job_id": job_id, "status": status}, future))
+        if len(self.pending) >= self.batch_size:
+            asyncio.create_task(self.flush())
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        # one request in flight at a time so a job's updates arrive in order
+        async with self._send_lock:
+            while self.pending:
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+                await self._send(batch)
+
+    async def _send(self, batch):
+        try:
+            if self.session is None:
+                self.session = aiohttp.ClientSession()
+            async with self.session.put(
+                f"{SERVER_URL}/api/v1/jobs/status",
+                headers={"X-Gateway-Token": GATEWAY_TOKEN},
+                json={"updates": [item for item, _ in batch]},
+            ) as response:
                 if response.status != 200:
                     text = await response.text()
                     raise Exception(f"Status update failed: {response.status} {text}")
+                results = (await response.json())["results"]
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if result["ok"]:
+                future.set_result(None)
+            else:
+                future.set_exception(Exception(f"Status update failed: {result['detail']}"))
+
+    async def close(self):
+        await self.flush()
+        if self.session is not None:
+            await self.session.close()
+
+status_batcher = StatusBatcher()
+
+async def update_job_status(job_id: int, new_status: str):
+    try:
+        print_status(job_id, message=f"🔄 Updating status to '{new_status}'")
+        await status_batcher.update(job_id, new_status)
         print_status(job_id, message=f"🟢 Status updated to '{new_status}'")
     except Exception as e:
         print_status(job_id, message=f"🔴 Status update failed: {str(e)}")
@@ -304,10 +465,10 @@ async def upload_logs(job_id: int, log_path: str):
 
 async def main():
     print_status(message="🏁 Starting gateway client")
-    await asyncio.gather(
-        poll_for_download_notifications(),
-        poll_for_job_notifications()
-    )
+    try:
+        await dispatch_notifications()
+    finally:
+        await status_batcher.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,58 @@
+import json
+from typing import Any, Dict, Union
+
+try:
+    import msgpack
+except ImportError:  # json-only installs
+    msgpack = None
+
+# Binary payloads are framed as MAGIC + version byte + body. 0xc1 is never
+# emitted by msgpack and can't start a json document, so anything without
+# the magic byte is a legacy json payload.
+MAGIC = b"\xc1"
+
+class JsonCodec:
+    name = "json"
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj, separators=(",", ":"))
+
+    def decode_body(self, body: bytes) -> Any:
+        return json.loads(body)
+
+class MsgpackCodec:
+    name = "msgpack"
+    version = 1
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("The msgpack codec needs the msgpack package installed")
+
+    def encode(self, obj: Any) -> bytes:
+        return MAGIC + bytes([self.version]) + msgpack.packb(obj, use_bin_type=True)
+
+    def decode_body(self, body: bytes) -> Any:
+        return msgpack.unpackb(body, raw=False)
+
+_CODECS = {
+    JsonCodec.name: JsonCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+_versioned: Dict[int, Any] = {}
+
+def get_codec(name: str):
+    if name not in _CODECS:
+        raise ValueError(f"Unknown queue codec '{name}'")
+    return _CODECS[name]()
+
+def decode(payload: Union[bytes, str]) -> Any:
+    if isinstance(payload, str):
+        return json.loads(payload)
+    if payload[:1] != MAGIC:
+        return json.loads(payload)
+    version = payload[1]
+    if version not in _versioned:
+        if version != MsgpackCodec.version:
+            raise ValueError(f"Unsupported queue payload version {version}")
+        _versioned[version] = MsgpackCodec()
+    return _versioned[version].decode_body(payload[2:])
@@ -1,11 +1,24 @@
 # queue/redis_client.py
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+from payload_codecs import decode, get_codec
+
+# "list" (BRPOP, at-most-once) or "stream" (consumer groups with acks), must match the server
+QUEUE_TRANSPORT = "list"
+# codec for payloads this client pushes; incoming payloads are decoded whatever their codec
+QUEUE_CODEC = "json"
+CONSUMER_GROUP = "gateway"
 
 class RedisClient:
+    JOBS_QUEUE = "jobs"
+    DOWNLOADS_QUEUE = "download_notifications"
+
     def __init__(self):
         self.redis_url = "redis://192.168.43.56:6379/0"
+        self.transport = QUEUE_TRANSPORT
+        self.codec = get_codec(QUEUE_CODEC)
         self._redis = None
 
     async def init(self):
@@ -13,7 +26,7 @@ class RedisClient:
             self._redis = await redis.from_url(
 		self.redis_url,
 		max_connections=20,
-		decode_responses=True,
+		decode_responses=False,  # payloads may be binary, see payload_codecs
 		health_check_interval=10,
 		socket_keepalive=True,
 		retry_on_timeout=True
@@ -25,16 +38,41 @@ class RedisClient:
     
     async def push_job(self, gateway_id: int, job_data: Dict[str, Any]):
         queue_key = f"gateway:{gateway_id}:jobs"
-        await self._redis.lpush(queue_key, json.dumps(job_data))
+        await self._redis.lpush(queue_key, self.codec.encode(job_data))
     
     async def get_job(self, gateway_id: int) -> Optional[Dict[str, Any]]:
         queue_key = f"gateway:{gateway_id}:jobs"
         result = await self._redis.brpop(queue_key, timeout=30)
         if result:
             _, job_data = result
-            return json.loads(job_data)
+            return decode(job_data)
         return None
 
+    def _list_key(self, gateway_id: int, queue: str) -> str:
+        return f"gateway:{gateway_id}:{queue}"
+
+    async def wait_for_messages(self, gateway_id: int, queues: List[str],
+                                timeout: int = 30, burst: int = 100) -> List[Tuple[str, Dict[str, Any]]]:
+        """Block on all of the gateway's queues at once, then drain what is already queued.
+
+        Returns (queue, payload) pairs, oldest first per queue, or an empty
+        list on timeout. Draining uses RPOP with a count (redis >= 6.2) in a
+        single round trip, so a burst clears without one BRPOP per message.
+        """
+        keys = {self._list_key(gateway_id, queue): queue for queue in queues}
+        result = await self._redis.brpop(list(keys), timeout=timeout)
+        if not result:
+            return []
+        key, payload = result
+        messages = [(keys[key.decode()], decode(payload))]
+
+        pipe = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.rpop(key, burst)
+        for queue, payloads in zip(keys.values(), await pipe.execute()):
+            messages.extend((queue, decode(payload)) for payload in payloads or [])
+        return messages
+
     async def publish_status(self, job_id: int, status: str, message: str):
         channel = f"job:{job_id}:status"
         await self._redis.publish(channel, json.dumps({
@@ -42,16 +80,87 @@ class RedisClient:
             "message": message
         }))
 
+    # --- stream transport ---
+    # entries stay in the consumer group's pending list until acked, so a
+    # gateway that dies mid-job gets them back on restart (or another
+    # consumer reclaims them once they have been idle long enough)
+
+    def _stream_key(self, gateway_id: int, queue: str) -> str:
+        return f"gateway:{gateway_id}:{queue}:stream"
+
+    async def ensure_consumer_group(self, gateway_id: int, queue: str):
+        try:
+            await self._redis.xgroup_create(
+                self._stream_key(gateway_id, queue), CONSUMER_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read_stream(self, gateway_id: int, queue: str, consumer: str,
+                          count: int = 10, block_ms: int = 30000,
+                          pending: bool = False) -> List[Tuple[str, Dict[str, Any]]]:
+        entries = await self.read_streams(gateway_id, [queue], consumer, count, block_ms, pending)
+        return [(entry_id, data) for _, entry_id, data in entries]
+
+    async def read_streams(self, gateway_id: int, queues: List[str], consumer: str,
+                           count: int = 10, block_ms: int = 30000,
+                           pending: bool = False) -> List[Tuple[str, str, Dict[str, Any]]]:
+        # one XREADGROUP over every queue's stream, returns (queue, entry_id, payload);
+        # pending=True re-reads entries already delivered to this consumer but never acked
+        keys = {self._stream_key(gateway_id, queue): queue for queue in queues}
+        result = await self._redis.xreadgroup(
+            CONSUMER_GROUP, consumer, {key: "0" if pending else ">" for key in keys},
+            count=count, block=None if pending else block_ms
+        )
+        entries = []
+        for stream_key, messages in result or []:
+            queue = keys[stream_key.decode()]
+            for entry_id, fields in messages:
+                if fields:
+                    entries.append((queue, entry_id.decode(), decode(fields[b"data"])))
+        return entries
+
+    async def ack(self, gateway_id: int, queue: str, entry_id: str):
+        stream_key = self._stream_key(gateway_id, queue)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.xack(stream_key, CONSUMER_GROUP, entry_id)
+        pipe.xdel(stream_key, entry_id)
+        await pipe.execute()
+
+    async def claim_stale(self, gateway_id: int, queue: str, consumer: str,
+                          min_idle_ms: int, count: int = 10) -> List[Tuple[str, Dict[str, Any]]]:
+        # take over entries left pending by other consumers that went away; our
+        # own pending entries are being worked on and are never taken back
+        stream_key = self._stream_key(gateway_id, queue)
+        pending = await self._redis.xpending_range(
+            stream_key, CONSUMER_GROUP, min="-", max="+", count=max(count, 100), idle=min_idle_ms
+        )
+        entry_ids = [entry["message_id"] for entry in pending if entry["consumer"].decode() != consumer][:count]
+        if not entry_ids:
+            return []
+        # XCLAIM checks the idle time again, so two consumers can't both take an entry
+        messages = await self._redis.xclaim(stream_key, CONSUMER_GROUP, consumer, min_idle_ms, entry_ids)
+        return [(entry_id.decode(), decode(fields[b"data"])) for entry_id, fields in messages if fields]
+
+    async def keep_alive(self, gateway_id: int, queue: str, consumer: str, entry_ids: List[str]):
+        # re-claiming our own entries resets their idle time, so a long job isn't
+        # mistaken for an abandoned one and run again by another consumer
+        if entry_ids:
+            await self._redis.xclaim(
+                self._stream_key(gateway_id, queue), CONSUMER_GROUP, consumer, 0, entry_ids, justid=True
+            )
+
     async def push_download_notification(self, gateway_id: int, notification: Dict[str, Any]):
         queue_key = f"gateway:{gateway_id}:download_notifications"
-        await self._redis.lpush(queue_key, json.dumps(notification))
+        await self._redis.lpush(queue_key, self.codec.encode(notification))
     
     async def get_download_notification(self, gateway_id: int) -> Optional[Dict[str, Any]]:
         queue_key = f"gateway:{gateway_id}:download_notifications"
         result = await self._redis.brpop(queue_key, timeout=30)
         if result:
             _, notification_data = result
-            return json.loads(notification_data)
+            return decode(notification_data)
         return None
 
 redis_client = RedisClient()
@@ -0,0 +1,201 @@
+"""Query plan regression check for the hot query paths.
+
+Migrates a throwaway SQLite database to head, seeds it, then drives the
+service functions and a scheduler pass while recording every statement they
+send. Each recorded SELECT/UPDATE/DELETE is run through EXPLAIN QUERY PLAN
+and the check fails (exit status 1) if any of them scans a whole table that
+grows with usage (jobs, job_groups, their archives, files, gateways) instead
+of searching an index. Walking an index in order under a LIMIT (a first page)
+is fine. devices and users are bounded by the lab and are not checked.
+
+Usage (from the repository root, e.g. in CI after touching a query or an index):
+
+    python -m tools.check_query_plans -v
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+CHECKED_TABLES = {"jobs", "job_groups", "jobs_archive", "job_groups_archive", "files", "gateways"}
+FULL_SCAN = re.compile(r"^SCAN (\w+)")
+INDEX_ORDER = re.compile(r" USING (COVERING )?INDEX ")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--groups", type=int, default=500, help="job groups to seed")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print the plan of every query")
+    return parser.parse_args(argv)
+
+def seed(args, SessionLocal, models):
+    rng = random.Random(1)
+    db = SessionLocal()
+    try:
+        users = [models.User(username=f"user-{i}", password_hash="x") for i in range(5)]
+        db.add_all(users)
+        db.flush()
+        files = [models.File(filename=f"f{i}.c", path="/dev/null", user_id=users[i % 5].id) for i in range(50)]
+        now = datetime.now(timezone.utc)
+        gateways = [
+            models.Gateway(
+                name=f"gw-{i}",
+                token_hash=f"hash-{i}",
+                status=models.DeviceStatus.available,
+                verification_status=models.VerificationStatus.verified,
+                last_seen=now - timedelta(hours=1) if i == 1 else now,
+            )
+            for i in range(20)
+        ]
+        db.add_all(files + gateways)
+        db.flush()
+        devices = [
+            models.Device(name=f"dev-{i}", gateway_id=gateways[i % 20].id, status=models.DeviceStatus.available)
+            for i in range(200)
+        ]
+        db.add_all(devices)
+        db.flush()
+        statuses = list(models.JobStatus)
+        for n in range(args.groups):
+            status = rng.choice(statuses)
+            group = models.JobGroup(name=f"g{n}", user_id=users[n % 5].id, status=status, jobs_total=4)
+            setattr(group, f"jobs_{status.value}", 4)
+            db.add(group)
+            db.flush()
+            db.add_all([
+                models.Job(
+                    group_id=group.id,
+                    device_id=device.id,
+                    source_file_id=files[n % 50].id,
+                    status=status,
+                )
+                for device in rng.sample(devices, 4)
+            ])
+        db.commit()
+        return users[0].id, gateways[0].id
+    finally:
+        db.close()
+
+async def exercise(user_id, gateway_id, SessionLocal, AsyncSessionLocal, models):
+    # every query path here runs on each request or scheduler pass
+    from app.scheduler.archiver import archiver
+    from app.scheduler.liveness import liveness_monitor
+    from app.scheduler.scheduler import scheduler
+    from app.schemas.schemas import JobStatusUpdate
+    from app.services.auth_service import AuthService
+    from app.services.device_service import DeviceService
+    from app.services.file_service import FileService
+    from app.services.gateway_service import GatewayService
+    from app.services.job_group_service import JobGroupService
+    from app.services.job_service import JobService
+
+    db = SessionLocal()
+    try:
+        group = (
+            db.query(models.JobGroup)
+            .filter(models.JobGroup.user_id == user_id, models.JobGroup.status == models.JobStatus.running)
+            .first()
+        )
+        job = group.jobs[0]
+        GatewayService.get_gateway_by_token("unknown-token", db)
+        GatewayService.gateway_heartbeat_service(gateway_id, [], db)
+        # listings: the first page and the page after a cursor, with each filter
+        _, cursor = JobGroupService.get_job_groups_service(user_id, db, limit=10)
+        JobGroupService.get_job_groups_service(user_id, db, cursor, 10)
+        JobGroupService.get_job_groups_service(user_id, db, cursor, 10, status=models.JobStatus.completed)
+        JobGroupService.get_job_groups_service(user_id, db, cursor, 10, device_id=job.device_id)
+        _, cursor = JobService.get_jobs_service(db, limit=10)
+        JobService.get_jobs_service(db, cursor, 10)
+        JobService.get_jobs_service(db, cursor, 10, status=models.JobStatus.completed)
+        JobService.get_jobs_service(db, cursor, 10, device_id=job.device_id)
+        JobService.get_jobs_service(db, cursor, 10, group_id=group.id)
+        JobService.get_jobs_service(db, cursor, 10, gateway_id=gateway_id)
+        _, cursor = DeviceService.get_devices_service(db, limit=10)
+        DeviceService.get_devices_service(db, cursor, 10, gateway_id=gateway_id)
+        JobGroupService.get_job_group_status_service(group.id, user_id, db)
+        JobService.update_job_status_service(job.id, JobStatusUpdate(status=models.JobStatus.completed), db)
+        JobGroupService.cancel_job_group_service(group.id, user_id, db)
+    finally:
+        db.close()
+
+    async with AsyncSessionLocal() as db:
+        user = await db.get(models.User, user_id)
+        await AuthService.get_current_user_async(db, AuthService.create_access_token({"sub": user.username}))
+        await FileService.get_user_files(db, user_id)
+        await JobGroupService.get_queue_status_service(user_id, db)
+        await GatewayService.get_gateway_by_token_async("unknown-token", db)
+
+    # a group that is only in the archive
+    db = SessionLocal()
+    try:
+        try:
+            JobGroupService.get_job_group_service(-1, user_id, db)
+        except Exception:
+            pass
+    finally:
+        db.close()
+    await archiver.archive_once()
+    # the second gateway stopped sending heartbeats an hour ago
+    liveness_monitor.sweep_once()
+
+    # own every shard; redis isn't running, so groups that get dispatched are released again
+    scheduler.leases.owned = set(range(scheduler.leases.shard_count))
+    logging.getLogger("app.scheduler.scheduler").setLevel(logging.CRITICAL)
+    await scheduler.check_and_dispatch_jobs()
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="query-plans-")
+    # app.config reads this when it is first imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'plans.db')}"
+
+    from sqlalchemy import event
+    from app.database import AsyncSessionLocal, SessionLocal, async_engine, engine
+    from app.migrations import upgrade_database
+    from app.models import models
+
+    upgrade_database()
+    user_id, gateway_id = seed(args, SessionLocal, models)
+    with engine.connect() as connection:
+        connection.exec_driver_sql("ANALYZE")
+        connection.commit()
+
+    statements = {}
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE"):
+            statements.setdefault(statement, parameters)
+
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    asyncio.run(exercise(user_id, gateway_id, SessionLocal, AsyncSessionLocal, models))
+
+    failures = 0
+    with engine.connect() as connection:
+        for statement, parameters in statements.items():
+            plan = [row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+            # walking an index in order under a LIMIT stops after one page
+            bounded = " LIMIT " in statement
+            scans = [
+                detail for detail in plan
+                if (match := FULL_SCAN.match(detail)) and match.group(1) in CHECKED_TABLES
+                and not (bounded and INDEX_ORDER.search(detail))
+            ]
+            summary = " ".join(statement.split())
+            if scans:
+                failures += 1
+                print(f"FULL SCAN  {summary}")
+            elif args.verbose:
+                print(f"ok         {summary}")
+            if scans or args.verbose:
+                for detail in plan:
+                    print(f"           | {detail}")
+    print(f"{len(statements)} queries checked, {failures} with full table scans")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Microbenchmark for the queue payload codecs.
+
+Measures encode/decode throughput and wire size of each codec in
+app/queue/payload_codecs.py for a minimal job payload and for a richer one
+carrying a firmware hash, build parameters and timing hints.
+
+Usage (from the repository root):
+
+    python -m tools.codec_bench --iterations 200000
+"""
+import argparse
+import hashlib
+import time
+
+from app.queue.payload_codecs import decode, get_codec, msgpack
+
+PAYLOADS = {
+    "job": {"job_id": 123456, "group_id": 4242, "device_id": 317},
+    "job+build": {
+        "job_id": 123456,
+        "group_id": 4242,
+        "device_id": 317,
+        "source_file_id": 98765,
+        "firmware_sha256": hashlib.sha256(b"firmware").hexdigest(),
+        "build": {
+            "target": "nrf52840",
+            "board": "dongle",
+            "defines": {f"CONF_{i}": i for i in range(16)},
+            "flags": ["-O2", "-g", "-DNDEBUG"],
+        },
+        "timing": {"expected_runtime": 118.5, "flash_timeout": 30, "log_timeout": 60},
+    },
+}
+
+def bench(codec, payload, iterations):
+    encoded = codec.encode(payload)
+    wire = encoded if isinstance(encoded, bytes) else encoded.encode()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(payload)
+    encode_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(wire)
+    decode_s = time.perf_counter() - start
+
+    assert decode(wire) == payload
+    return len(wire), iterations / encode_s, iterations / decode_s
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Queue payload codec microbenchmark")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    codecs = ["json"] + (["msgpack"] if msgpack is not None else [])
+    print(f"{'payload':<10} {'codec':<8} {'bytes':>6} {'encode/s':>12} {'decode/s':>12}")
+    for payload_name, payload in PAYLOADS.items():
+        for codec_name in codecs:
+            size, encode_rate, decode_rate = bench(get_codec(codec_name), payload, args.iterations)
+            print(f"{payload_name:<10} {codec_name:<8} {size:>6} {encode_rate:>12,.0f} {decode_rate:>12,.0f}")
+    if msgpack is None:
+        print("msgpack is not installed, only json was measured")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Offline simulator for the job scheduler.
+
+Drives the real JobScheduler against a synthetic testbed kept in a throwaway
+SQLite database and an in-process fake redis (fakeredis), so scheduling
+policies and changes to check_and_dispatch_jobs can be compared without
+touching the lab.
+
+Job groups arrive as a Poisson process, each targeting a random set of
+devices, and every job "runs" for a runtime drawn from an exponential
+distribution before its completion is reported through
+JobService.update_job_status_service, the same path the gateways use.
+Simulated time is compressed by --time-scale.
+
+Usage (from the repository root, needs `pip install fakeredis lupa`):
+
+    python -m tools.scheduler_sim --gateways 200 --devices 2000 \\
+        --arrival-rate 0.5 --mean-runtime 120 --duration 3600 --policy easy
+
+QUEUE_CODEC and QUEUE_TRANSPORT are taken from the environment as usual.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--gateways", type=int, default=100)
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--arrival-rate", type=float, default=0.5,
+                        help="job group arrivals per simulated second")
+    parser.add_argument("--mean-group-size", type=float, default=8,
+                        help="mean number of devices per group (geometric)")
+    parser.add_argument("--max-group-size", type=int, default=128)
+    parser.add_argument("--mean-runtime", type=float, default=120,
+                        help="mean job runtime in simulated seconds")
+    parser.add_argument("--duration", type=float, default=3600,
+                        help="length of the arrival window in simulated seconds")
+    parser.add_argument("--time-scale", type=float, default=0.001,
+                        help="wall seconds per simulated second")
+    parser.add_argument("--policy", default="fifo", choices=["fifo", "easy", "conservative"])
+    parser.add_argument("--sweep-interval", type=float, default=30,
+                        help="scheduler safety-net sweep in simulated seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+def configure_environment(args, db_path):
+    # app.config reads these when it is first imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["SCHEDULER_POLICY"] = args.policy
+    os.environ["SCHEDULER_SWEEP_INTERVAL"] = str(args.sweep_interval * args.time_scale)
+    os.environ["SCHEDULER_DEFAULT_RUNTIME"] = str(args.mean_runtime * args.time_scale)
+    os.environ["SCHEDULER_SHARDS"] = "1"
+
+def percentiles(values, qs=(0.5, 0.9, 0.99)):
+    if not values:
+        return {f"p{int(q * 100)}": None for q in qs}
+    ordered = sorted(values)
+    return {f"p{int(q * 100)}": ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in qs}
+
+def build_testbed(args, SessionLocal, models):
+    db = SessionLocal()
+    try:
+        user = models.User(username="sim", password_hash="x")
+        db.add(user)
+        db.flush()
+        source = models.File(filename="sim.c", path="/dev/null", user_id=user.id)
+        db.add(source)
+        gateways = [
+            models.Gateway(
+                name=f"gw-{i}",
+                token_hash=f"sim-{i}",
+                status=models.DeviceStatus.available,
+                verification_status=models.VerificationStatus.verified,
+            )
+            for i in range(args.gateways)
+        ]
+        db.add_all(gateways)
+        db.flush()
+        devices = [
+            models.Device(
+                name=f"dev-{i}",
+                gateway_id=gateways[i % len(gateways)].id,
+                status=models.DeviceStatus.available,
+            )
+            for i in range(args.devices)
+        ]
+        db.add_all(devices)
+        db.commit()
+        return user.id, source.id, [device.id for device in devices], [gateway.id for gateway in gateways]
+    finally:
+        db.close()
+
+async def run(args):
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("scheduler_sim needs fakeredis (pip install fakeredis lupa)")
+
+    workdir = tempfile.mkdtemp(prefix="scheduler-sim-")
+    configure_environment(args, os.path.join(workdir, "sim.db"))
+
+    from app.models import models
+    from app.database import engine, SessionLocal
+    from app.queue.payload_codecs import decode
+    from app.queue.redis_client import redis_client
+    from app.scheduler.scheduler import scheduler
+    from app.scheduler.notifier import scheduler_notifier
+    from app.services.job_service import JobService
+    from app.schemas.schemas import JobStatusUpdate
+
+    models.Base.metadata.create_all(bind=engine)
+    server = fakeredis.FakeServer()
+    redis_client._redis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    # the gateways read raw bytes like the real client, msgpack payloads aren't utf-8
+    gateway_redis = fakeredis.FakeAsyncRedis(server=server)
+    rng = random.Random(args.seed)
+    user_id, file_id, device_ids, gateway_ids = build_testbed(args, SessionLocal, models)
+    scale = args.time_scale
+
+    def submit_group(n):
+        size = min(len(device_ids), args.max_group_size, max(1, int(rng.expovariate(1 / args.mean_group_size)) + 1))
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            group = models.JobGroup(
+                name=f"sim-{n}",
+                user_id=user_id,
+                status=models.JobStatus.pending,
+                created_at=now,
+                jobs_total=size,
+                jobs_pending=size,
+            )
+            db.add(group)
+            db.flush()
+            db.add_all([
+                models.Job(
+                    group_id=group.id,
+                    device_id=device_id,
+                    source_file_id=file_id,
+                    status=models.JobStatus.pending,
+                    created_at=now,
+                )
+                for device_id in rng.sample(device_ids, size)
+            ])
+            db.commit()
+        finally:
+            db.close()
+        scheduler_notifier.notify("group_pending", broadcast=False)
+
+    def finish_job(job_id):
+        db = SessionLocal()
+        try:
+            JobService.update_job_status_service(job_id, JobStatusUpdate(status=models.JobStatus.completed), db)
+        finally:
+            db.close()
+
+    async def arrivals():
+        n = 0
+        deadline = time.monotonic() + args.duration * scale
+        while True:
+            await asyncio.sleep(rng.expovariate(args.arrival_rate) * scale)
+            if time.monotonic() >= deadline:
+                return n
+            await asyncio.to_thread(submit_group, n)
+            n += 1
+
+    async def run_job(job_id):
+        await asyncio.sleep(rng.expovariate(1 / args.mean_runtime) * scale)
+        await asyncio.to_thread(finish_job, job_id)
+
+    running_jobs = set()
+    stopping = asyncio.Event()
+
+    def start_job(job_data):
+        task = asyncio.create_task(run_job(decode(job_data)["job_id"]))
+        running_jobs.add(task)
+        task.add_done_callback(running_jobs.discard)
+
+    async def gateways():
+        keys = [redis_client._queue_key(gateway_id, redis_client.JOBS_QUEUE) for gateway_id in gateway_ids]
+        last_ids = {key: "0" for key in keys}
+        # poll with a timeout rather than relying on cancelling a blocking read
+        while not stopping.is_set():
+            if redis_client.transport == "stream":
+                for stream_key, entries in await gateway_redis.xread(last_ids, block=1000) or []:
+                    for entry_id, fields in entries:
+                        last_ids[stream_key.decode()] = entry_id
+                        start_job(fields[b"data"])
+            else:
+                result = await gateway_redis.brpop(keys, timeout=1)
+                if result:
+                    start_job(result[1])
+
+    scheduler_task = asyncio.create_task(scheduler.start())
+    gateway_task = asyncio.create_task(gateways())
+    started = time.monotonic()
+    submitted = await arrivals()
+    wall = time.monotonic() - started
+
+    stopping.set()
+    await gateway_task
+    for task in list(running_jobs):
+        task.cancel()
+    await asyncio.gather(*running_jobs, return_exceptions=True)
+    await scheduler.stop()
+    await asyncio.gather(scheduler_task, return_exceptions=True)
+
+    db = SessionLocal()
+    try:
+        groups = db.query(models.JobGroup.created_at, models.JobGroup.started_at).all()
+    finally:
+        db.close()
+    waits = [
+        (started_at - created_at).total_seconds() / scale
+        for created_at, started_at in groups
+        if started_at is not None
+    ]
+    stats = scheduler.get_stats()
+    policy_stats = stats["policies"].get(args.policy, {})
+
+    print(f"policy                 {args.policy}")
+    print(f"testbed                {args.devices} devices / {args.gateways} gateways")
+    print(f"simulated              {args.duration:.0f}s in {wall:.1f}s wall")
+    print(f"groups submitted       {submitted}, dispatched {len(waits)}, still queued {len(groups) - len(waits)}")
+    print(f"scheduler passes       {stats['passes']}")
+    print(f"dispatch latency ms    {stats['dispatch_latency_ms']}")
+    print(f"pass duration ms       {stats['pass_duration_ms']}")
+    print(f"device utilization     {policy_stats.get('device_utilization')}")
+    print(f"queue wait (sim s)     {percentiles(waits)}")
+
+def main(argv=None):
+    asyncio.run(run(parse_args(argv)))
+
+if __name__ == "__main__":
+    main()